@@ -0,0 +1,452 @@
+import argparse
+import json
+import os
+import platform
+import shelve
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import tcod
+
+from src.entity import Entity
+from src.fov_functions import initialize_fov, recompute_fov
+from src.loader_functions.data_loaders import load_game, load_legacy_game, save_game
+from src.loader_functions.initialize_new_game import get_game_constants, get_game_variables
+from src.map_objects.game_map import GameMap
+from src.prototypes import spawn
+from src.random_utils import GameRandom
+from src.render_functions import RenderCache, render_all
+from src.spatial_index import EntityList
+from src.turn_engine import TurnEngine
+
+"""
+    Benchmark suite for the hot paths - map generation, field of view, rendering,
+    A* and the enemy phase - across map sizes and monster densities,
+    plus saving and loading a game on a deep floor.
+
+    python -m src.benchmark --output baseline.json
+    python -m src.benchmark --compare baseline.json
+"""
+
+DEFAULT_SIZES = '80x43,200x200,500x500,1000x1000'
+DEFAULT_DENSITIES = '0.005,0.02'
+
+# Rooms per tile of map, taken from the default 30 rooms on an 80x43 map
+ROOMS_PER_TILE = 30 / (80 * 43)
+
+# Floor the save and load benchmarks are run on, every floor above it is in the floor store
+DEEP_FLOOR = 10
+
+
+# Times a function over a number of repeats, calling setup (untimed) before each one
+def measure(run, setup=None, repeats=5):
+    timings = []
+
+    for _ in range(repeats):
+        if setup:
+            setup()
+
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'repeats': repeats,
+        'min_ms': min(timings) * 1000,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000
+    }
+
+
+# Constants for a map of the given size, with the room count scaled to the map area
+def get_constants(width, height):
+    constants = get_game_constants()
+    constants['map_width'] = width
+    constants['map_height'] = height
+    constants['max_rooms'] = max(30, int(width * height * ROOMS_PER_TILE))
+
+    # A floor generating in the background would skew the timings
+    constants['pregenerate_floors'] = False
+
+    return constants
+
+
+# Builds a seeded game of the given size
+def make_game(width, height, seed):
+    constants = get_constants(width, height)
+    player, entities, game_map, message_log, game_state = get_game_variables(constants, seed)
+
+    return constants, TurnEngine(player, entities, game_map, message_log, game_state, constants)
+
+
+# Fills floor tiles with orcs until the given fraction of the floor holds a monster
+def populate(engine, density, seed):
+    rng = np.random.RandomState(seed)
+    game_map = engine.game_map
+
+    occupied = np.zeros((game_map.width, game_map.height), dtype=bool)
+    for entity in engine.entities:
+        occupied[entity.x, entity.y] = True
+
+    free_x, free_y = np.nonzero(~game_map.blocked & ~occupied)
+    count = min(len(free_x), int(len(free_x) * density))
+
+    for i in rng.choice(len(free_x), count, replace=False):
+        engine.entities.append(spawn('orc', int(free_x[i]), int(free_y[i])))
+
+    return count
+
+
+def bench_generation(width, height, seed, repeats, room_index='bitmap'):
+    constants = get_constants(width, height)
+    state = {}
+
+    def setup():
+        player = Entity(0, 0, '@', tcod.white, 'Player', blocks=True)
+        state['entities'] = EntityList([player])
+        state['player'] = player
+        state['game_map'] = GameMap(width, height, rng=GameRandom(seed))
+
+    def run():
+        state['game_map'].make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
+                                   width, height, state['player'], state['entities'], room_index)
+
+    return measure(run, setup, repeats)
+
+
+# Generation with the original room overlap check, for comparison against the room bitmap
+def bench_generation_room_list(width, height, seed, repeats):
+    return bench_generation(width, height, seed, repeats, 'list')
+
+
+def bench_fov_initialize(width, height, seed, repeats):
+    constants, engine = make_game(width, height, seed)
+    game_map = engine.game_map
+
+    def setup():
+        game_map.fov_map = None
+
+    return measure(lambda: initialize_fov(game_map), setup, repeats)
+
+
+def bench_fov_recompute(width, height, seed, repeats):
+    constants, engine = make_game(width, height, seed)
+    player = engine.player
+
+    def run():
+        recompute_fov(engine.fov_map, player.x, player.y, constants['fov_radius'], constants['fov_light_walls'],
+                      constants['fov_algorithm'])
+
+    return measure(run, repeats=repeats)
+
+
+def bench_render(width, height, seed, repeats):
+    constants, engine = make_game(width, height, seed)
+    panel_height = constants['panel_height']
+
+    # Offscreen consoles big enough for the whole map
+    con = tcod.console.Console(width, height + panel_height)
+    panel = tcod.console.Console(width, panel_height)
+    mouse = tcod.Mouse()
+
+    def run():
+        render_all(con, panel, engine.entities, engine.player, engine.game_map, engine.fov_map, True,
+                   engine.message_log, width, height + panel_height, constants['bar_width'], panel_height, height,
+                   mouse, constants['colors'], engine.game_state)
+
+    return measure(run, repeats=repeats)
+
+
+# One frame after a single monster moved, on a floor full of monsters with the render cache warm
+def bench_render_frame(width, height, seed, repeats):
+    constants, engine = make_game(width, height, seed)
+    populate(engine, 0.05, seed)
+    panel_height = constants['panel_height']
+
+    con = tcod.console.Console(width, height + panel_height)
+    panel = tcod.console.Console(width, panel_height)
+    mouse = tcod.Mouse()
+    cache = RenderCache()
+    engine.fov_map.fov[...] = True
+
+    def render(fov_recompute):
+        render_all(con, panel, engine.entities, engine.player, engine.game_map, engine.fov_map, fov_recompute,
+                   engine.message_log, width, height + panel_height, constants['bar_width'], panel_height, height,
+                   mouse, constants['colors'], engine.game_state, cache=cache)
+
+    monster = next(entity for entity in engine.entities if entity.ai)
+    render(True)
+
+    def run():
+        monster.x = monster.x
+        render(False)
+
+    result = measure(run, repeats=repeats)
+    result['entities'] = len(engine.entities)
+
+    return result
+
+
+def bench_astar(width, height, seed, repeats):
+    constants, engine = make_game(width, height, seed)
+    monster = next((entity for entity in engine.entities if entity.ai), None)
+
+    if monster is None:
+        return None
+
+    start = (monster.x, monster.y)
+
+    def setup():
+        monster.x, monster.y = start
+
+    return measure(lambda: monster.move_astar(engine.player, engine.entities, engine.game_map), setup, repeats)
+
+
+def bench_enemy_phase(width, height, seed, repeats, density):
+    constants, engine = make_game(width, height, seed)
+    monsters = populate(engine, density, seed)
+
+    # Every monster is awake and the player can't die, so each phase does the full amount of work
+    engine.player.fighter.hp = engine.player.fighter.max_hp = 10 ** 9
+    engine.fov_map.fov[...] = True
+
+    result = measure(engine.take_enemy_turns, repeats=repeats)
+    result['monsters'] = sum(1 for entity in engine.entities if entity.ai)
+    result['added_monsters'] = monsters
+
+    return result
+
+
+# Marks a floor as fully explored - every floor tile and the walls around it
+def explore(game_map):
+    floor = np.pad(~np.asarray(game_map.blocked), 1)
+    seen = np.zeros_like(floor)
+
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            seen[1:-1, 1:-1] |= floor[1 + dx:floor.shape[0] - 1 + dx, 1 + dy:floor.shape[1] - 1 + dy]
+
+    game_map.explored[:, :] = seen[1:-1, 1:-1]
+
+
+# Takes the player down to a deep floor, with every floor above explored and a few items in their inventory
+def make_deep_game(width, height, seed):
+    constants, engine = make_game(width, height, seed)
+
+    for dungeon_level in range(2, DEEP_FLOOR + 1):
+        explore(engine.game_map)
+        engine.entities = engine.game_map.change_floor(dungeon_level, engine.player, engine.entities,
+                                                       engine.message_log, constants)
+
+    for prototype in ('healing_potion', 'lightning_scroll', 'fireball_scroll', 'confusion_scroll'):
+        engine.player.inventory.items.append(spawn(prototype, engine.player.x, engine.player.y))
+
+    return constants, engine
+
+
+def game_objects(engine):
+    return engine.player, engine.entities, engine.game_map, engine.message_log, engine.game_state
+
+
+# Saves the way games were saved before the binary format, for comparison
+def save_shelve(path, player, entities, game_map, message_log, game_state):
+    with shelve.open(path, 'n') as data_file:
+        data_file['player_index'] = entities.index(player)
+        data_file['entities'] = entities
+        data_file['game_map'] = game_map
+        data_file['message_log'] = message_log
+        data_file['game_state'] = game_state
+
+
+# Total size of the files starting with the given path (shelve writes several)
+def files_size(path):
+    directory, prefix = os.path.split(path)
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+               if name.startswith(prefix))
+
+
+def bench_save(width, height, seed, repeats):
+    constants, engine = make_deep_game(width, height, seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'savegame.yarg')
+        result = measure(lambda: save_game(*game_objects(engine), path=path), repeats=repeats)
+        result['bytes'] = files_size(path)
+
+    return result
+
+
+def bench_load(width, height, seed, repeats):
+    constants, engine = make_deep_game(width, height, seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'savegame.yarg')
+        save_game(*game_objects(engine), path=path)
+
+        return measure(lambda: load_game(path, os.path.join(directory, 'savegame')), repeats=repeats)
+
+
+def bench_save_shelve(width, height, seed, repeats):
+    constants, engine = make_deep_game(width, height, seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'savegame')
+        result = measure(lambda: save_shelve(path, *game_objects(engine)), repeats=repeats)
+        result['bytes'] = files_size(path)
+
+    return result
+
+
+def bench_load_shelve(width, height, seed, repeats):
+    constants, engine = make_deep_game(width, height, seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'savegame')
+        save_shelve(path, *game_objects(engine))
+
+        return measure(lambda: load_legacy_game(path), repeats=repeats)
+
+
+BENCHMARKS = {
+    'generation': bench_generation,
+    'generation_room_list': bench_generation_room_list,
+    'fov_initialize': bench_fov_initialize,
+    'fov_recompute': bench_fov_recompute,
+    'render': bench_render,
+    'render_frame': bench_render_frame,
+    'astar': bench_astar,
+    'save': bench_save,
+    'load': bench_load,
+    'save_shelve': bench_save_shelve,
+    'load_shelve': bench_load_shelve
+}
+
+
+# Runs every benchmark at every size (and the enemy phase at every density)
+def run_suite(sizes, densities, seed, repeats, only=None):
+    results = []
+
+    for width, height in sizes:
+        for name, bench in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+
+            result = bench(width, height, seed, repeats)
+
+            if result:
+                result.update({'name': name, 'size': '{0}x{1}'.format(width, height)})
+                results.append(result)
+                report(result)
+
+        if not only or 'enemy_phase' in only:
+            for density in densities:
+                result = bench_enemy_phase(width, height, seed, repeats, density)
+                result.update({'name': 'enemy_phase', 'size': '{0}x{1}'.format(width, height), 'density': density})
+                results.append(result)
+                report(result)
+
+    return results
+
+
+# Prints one result as it finishes
+def report(result):
+    label = '{0} {1}'.format(result['name'], result['size'])
+
+    if 'density' in result:
+        label += ' density={0}'.format(result['density'])
+
+    line = '{0:<45} median {1:10.3f} ms   min {2:10.3f} ms'.format(label, result['median_ms'], result['min_ms'])
+
+    if 'bytes' in result:
+        line += '   {0} bytes'.format(result['bytes'])
+
+    print(line, file=sys.stderr)
+
+
+# Key identifying the same benchmark across runs
+def result_key(result):
+    return result['name'], result['size'], result.get('density')
+
+
+# Compares results against a stored baseline, returning the benchmarks whose median slowed down past the threshold
+def compare(results, baseline, threshold):
+    baseline_results = {result_key(result): result for result in baseline['results']}
+    regressions = []
+
+    print('{0:<45} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'baseline ms', 'current ms', 'change'))
+
+    for result in results:
+        key = result_key(result)
+        previous = baseline_results.get(key)
+
+        if previous is None:
+            continue
+
+        change = result['median_ms'] / previous['median_ms'] - 1 if previous['median_ms'] else 0
+        flag = ''
+
+        if change > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+
+        print('{0:<45} {1:12.3f} {2:12.3f} {3:+7.1%}{4}'.format(' '.join(str(part) for part in key if part is not None),
+                                                              previous['median_ms'], result['median_ms'], change,
+                                                              flag))
+
+    return regressions
+
+
+def parse_sizes(text):
+    return [tuple(int(part) for part in size.split('x')) for size in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times map generation, FOV, rendering, A*, the enemy phase, '
+                                                 'and saving and loading.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated map sizes, e.g. 80x43,200x200')
+    parser.add_argument('--densities', default=DEFAULT_DENSITIES,
+                        help='comma separated fractions of floor tiles holding a monster, for the enemy phase')
+    parser.add_argument('--only', help='comma separated benchmark names to run ({0}, enemy_phase)'.format(
+        ', '.join(BENCHMARKS)))
+    parser.add_argument('--repeats', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--seed', type=int, default=1, help='game seed')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare the results against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown (as a fraction of the baseline median) that counts as a regression')
+    args = parser.parse_args()
+
+    results = run_suite(parse_sizes(args.sizes), [float(density) for density in args.densities.split(',')],
+                        args.seed, args.repeats, args.only.split(',') if args.only else None)
+
+    output = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'tcod': tcod.__version__,
+            'numpy': np.__version__,
+            'seed': args.seed,
+            'repeats': args.repeats
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(output, output_file, indent=2)
+    elif not args.compare:
+        print(json.dumps(output, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
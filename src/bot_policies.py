@@ -0,0 +1,140 @@
+from collections import deque
+
+import numpy as np
+import tcod
+
+from src.component_store import AI, BLOCKS, ITEM, STAIRS
+from src.game_states import GameStates
+from src.item_functions import heal
+
+"""
+    Bot policies that play the game through the headless turn engine.
+    A policy looks at the engine and returns the action dict for the next step (the same dicts the input
+    handlers return), or None once it has nothing left to do.
+"""
+
+# Neighbouring tiles, in the order the bot tries them
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (1, -1), (-1, 1), (1, 1))
+
+
+# Walks to the nearest monster and fights it, drinks potions when hurt, picks up items and takes the stairs
+class HunterBot:
+    def __init__(self, heal_below=0.5, level_up_choice='hp'):
+        self.heal_below = heal_below
+        self.level_up_choice = level_up_choice
+
+    def next_action(self, engine):
+        game_state = engine.game_state
+
+        if game_state == GameStates.PLAYER_DEAD:
+            return None
+        elif game_state == GameStates.LEVEL_UP:
+            return {'level_up': self.level_up_choice}
+        elif game_state != GameStates.PLAYERS_TURN:
+            # Backs out of menus and targeting
+            return {'exit': True}
+
+        player = engine.player
+        entities = engine.entities
+
+        # Drinks a potion when hurt (opening the inventory and choosing the item in the same step)
+        if player.fighter.hp < player.fighter.max_hp * self.heal_below:
+            for index, item in enumerate(player.inventory.items):
+                if item.item.use_function is heal:
+                    return {'show_inventory': True, 'inventory_index': index}
+
+        # Fights the nearest visible monster
+        monsters = entities.nearest(player.x, player.y, components=AI, fov_map=engine.fov_map)
+
+        if monsters:
+            target = monsters[0]
+            action = self.step_towards(engine, target.x, target.y)
+
+            if action:
+                return action
+
+        # Picks up whatever is underfoot
+        if any(entity.item for entity in entities.at(player.x, player.y)):
+            return {'pickup': True}
+
+        # Walks over to visible items
+        items = entities.nearest(player.x, player.y, components=ITEM, fov_map=engine.fov_map)
+
+        if items:
+            target = items[0]
+            action = self.step_towards(engine, target.x, target.y)
+
+            if action:
+                return action
+
+        # Heads down once the stairs have been found
+        for entity in entities.select(STAIRS):
+            stairs_down = entity.stairs.floor > engine.game_map.dungeon_level
+
+            if stairs_down and engine.game_map.explored[entity.x, entity.y]:
+                if (entity.x, entity.y) == (player.x, player.y):
+                    return {'take_stairs_down': True}
+
+                action = self.step_towards(engine, entity.x, entity.y)
+
+                if action:
+                    return action
+
+        return self.explore(engine)
+
+    # Moves one step along an A* path to the given tile (moving into a monster attacks it)
+    def step_towards(self, engine, target_x, target_y):
+        game_map = engine.game_map
+        player = engine.player
+
+        cost = (~game_map.blocked).astype(np.int8)
+
+        for entity in engine.entities.select(BLOCKS):
+            if (entity.x, entity.y) != (target_x, target_y):
+                cost[entity.x, entity.y] = 0
+
+        cost[player.x, player.y] = 1
+        path = tcod.path.AStar(cost, 1.41).get_path(player.x, player.y, target_x, target_y)
+
+        if not path:
+            return None
+
+        x, y = path[0]
+        return {'move': (x - player.x, y - player.y)}
+
+    # Breadth first search towards the closest walkable tile that hasn't been seen yet
+    def explore(self, engine):
+        game_map = engine.game_map
+        player = engine.player
+
+        start = (player.x, player.y)
+        came_from = {start: None}
+        frontier = deque([start])
+
+        while frontier:
+            x, y = frontier.popleft()
+
+            if (x, y) != start and not game_map.explored[x, y]:
+                # Walk back to the first step of the path
+                while came_from[(x, y)] != start:
+                    x, y = came_from[(x, y)]
+
+                return {'move': (x - player.x, y - player.y)}
+
+            for dx, dy in DIRECTIONS:
+                neighbour = (x + dx, y + dy)
+
+                if (neighbour not in came_from and 0 <= neighbour[0] < game_map.width and
+                        0 <= neighbour[1] < game_map.height and not game_map.blocked[neighbour] and
+                        not engine.entities.blocking_at(*neighbour)):
+                    came_from[neighbour] = (x, y)
+                    frontier.append(neighbour)
+
+        # Nothing left to explore and no way down
+        return {'wait': True}
+
+
+# Policies available to the simulator, by name
+POLICIES = {
+    'hunter': HunterBot
+}
@@ -0,0 +1,41 @@
+"""
+    Camera that follows the player, so the map can be bigger than the screen.
+    Only the part of the map inside the viewport is drawn.
+"""
+
+
+class Camera:
+    def __init__(self, width, height, x=0, y=0):
+        # Viewport size in tiles, and the map coordinates of its top left corner
+        self.width = width
+        self.height = height
+        self.x = x
+        self.y = y
+
+    # Centers the viewport on the target, keeping it inside the map. Returns True if the camera moved
+    def update(self, target, game_map):
+        x = min(max(target.x - self.width // 2, 0), max(game_map.width - self.width, 0))
+        y = min(max(target.y - self.height // 2, 0), max(game_map.height - self.height, 0))
+
+        moved = (x, y) != (self.x, self.y)
+        self.x = x
+        self.y = y
+
+        return moved
+
+    # Map tiles covered by the viewport, as slices into the map layers
+    def view_slices(self, game_map):
+        return (slice(self.x, min(self.x + self.width, game_map.width)),
+                slice(self.y, min(self.y + self.height, game_map.height)))
+
+    # Checks if a map tile is inside the viewport
+    def in_view(self, x, y):
+        return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
+
+    # Converts map coordinates to screen (console) coordinates
+    def to_screen(self, x, y):
+        return x - self.x, y - self.y
+
+    # Converts screen (console) coordinates to map coordinates
+    def to_map(self, x, y):
+        return x + self.x, y + self.y
@@ -0,0 +1,237 @@
+import array
+import operator
+
+import numpy as np
+
+"""
+    Struct-of-arrays store for the entities on a floor.
+    Positions, fighter stats and render order are kept in typed arrays with one row per entity, in the order
+    of the floor's EntityList, plus a signature column with a bit for every component the entity has.
+    Entities (and their fighters) in a store read and write those fields through to their row, so the
+    Entity API is unchanged, while queries over the whole floor ("every living fighter in view") are
+    array operations rather than a Python loop over every entity.
+"""
+
+# Signature bits, one per component
+FIGHTER = 1
+AI = 2
+ITEM = 4
+INVENTORY = 8
+STAIRS = 16
+LEVEL = 32
+BLOCKS = 64
+
+# Columns and their array type codes
+COLUMNS = (
+    ('x', 'i'),
+    ('y', 'i'),
+    ('render_order', 'b'),
+    ('signature', 'B'),
+    ('hp', 'i'),
+    ('max_hp', 'i'),
+    ('defense', 'i'),
+    ('power', 'i'),
+    ('xp', 'i')
+)
+
+# Fighter stats, zero for entities without a fighter
+FIGHTER_COLUMNS = ('hp', 'max_hp', 'defense', 'power', 'xp')
+
+
+# A component attribute of Entity, held in the slot '_<name>'
+# Reading it is a plain attribute lookup, setting it keeps the signature of the entity's row up to date
+def component_slot(name, bit):
+    attribute = '_' + name
+
+    def set_component(entity, component):
+        previous = getattr(entity, attribute, None)
+        setattr(entity, attribute, component)
+
+        if entity.store is not None:
+            entity.store.replace_component(entity, bit, previous, component)
+
+        if entity.spatial_index is not None:
+            entity.spatial_index.touch(entity)
+
+    return property(operator.attrgetter(attribute), set_component)
+
+
+# A Fighter stat - read from and written to the store while the fighter's entity is in one
+class StoredStat:
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.attribute = '_' + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        store = instance.store
+
+        if store is None:
+            return getattr(instance, self.attribute)
+
+        return getattr(store, self.name)[instance.row]
+
+    def __set__(self, instance, value):
+        store = instance.store
+
+        if store is None:
+            setattr(instance, self.attribute, value)
+        else:
+            getattr(store, self.name)[instance.row] = value
+
+
+# Signature bits of an entity's components
+def signature_of(entity):
+    return ((FIGHTER if entity.fighter else 0) | (AI if entity.ai else 0) | (ITEM if entity.item else 0) |
+            (INVENTORY if entity.inventory else 0) | (STAIRS if entity.stairs else 0) |
+            (LEVEL if entity.level else 0) | (BLOCKS if entity.blocks else 0))
+
+
+class ComponentStore:
+    def __init__(self):
+        # Row -> entity
+        self.entities = []
+
+        for name, typecode in COLUMNS:
+            setattr(self, name, array.array(typecode))
+
+    def __len__(self):
+        return len(self.entities)
+
+    # Adds an entity as the last row, its fields are read first as they may still live in another floor's store
+    def add(self, entity):
+        fighter = entity.fighter
+        values = [entity.x, entity.y, entity.render_order.value, signature_of(entity)]
+        values.extend(getattr(fighter, name) if fighter else 0 for name in FIGHTER_COLUMNS)
+
+        for (name, typecode), value in zip(COLUMNS, values):
+            getattr(self, name).append(value)
+
+        self.entities.append(entity)
+        self.bind(entity, len(self.entities) - 1)
+
+    # Adds entities as the last rows, a column at a time
+    def extend(self, entities):
+        entities = list(entities)
+        first_row = len(self.entities)
+
+        fighters = [entity.fighter for entity in entities]
+        self.x.extend([entity.x for entity in entities])
+        self.y.extend([entity.y for entity in entities])
+        self.render_order.extend([entity.render_order.value for entity in entities])
+        self.signature.extend([signature_of(entity) for entity in entities])
+
+        for name in FIGHTER_COLUMNS:
+            getattr(self, name).extend([getattr(fighter, name) if fighter else 0 for fighter in fighters])
+
+        self.entities.extend(entities)
+        for row, entity in enumerate(entities, first_row):
+            self.bind(entity, row)
+
+    # Removes an entity's row, the entity keeps its fields from then on
+    def remove(self, entity):
+        if entity.store is self:
+            row = entity.row
+
+            entity._x, entity._y, entity._render_order = entity.x, entity.y, entity.render_order
+            entity.store = entity.row = None
+
+            if entity.fighter is not None and entity.fighter.store is self:
+                self.release_fighter(entity.fighter)
+        else:
+            # The entity has already been added to another floor's store
+            row = self.entities.index(entity)
+
+        del self.entities[row]
+        for name, typecode in COLUMNS:
+            del getattr(self, name)[row]
+
+        # The rows after it move up one
+        for index in range(row, len(self.entities)):
+            if self.entities[index].store is self:
+                self.bind(self.entities[index], index)
+
+    # Points an entity (and its fighter) at its row
+    def bind(self, entity, row):
+        entity.store = self
+        entity.row = row
+
+        if entity.fighter is not None:
+            entity.fighter.store = self
+            entity.fighter.row = row
+
+    # Hands a fighter's stats back to it
+    def release_fighter(self, fighter):
+        for name in FIGHTER_COLUMNS:
+            setattr(fighter, '_' + name, getattr(fighter, name))
+
+        fighter.store = fighter.row = None
+
+    # Updates an entity's row after one of its components was replaced (or removed, when it is None)
+    def replace_component(self, entity, bit, previous, component):
+        row = entity.row
+
+        if component:
+            self.signature[row] |= bit
+        else:
+            self.signature[row] &= 0xFF ^ bit
+
+        if bit == FIGHTER:
+            if previous is not None and previous.store is self:
+                self.release_fighter(previous)
+
+            if component is not None:
+                for name in FIGHTER_COLUMNS:
+                    getattr(self, name)[row] = getattr(component, name)
+
+                component.store = self
+                component.row = row
+
+    # A column as a NumPy array (a view, only valid until the next entity is added or removed)
+    def column(self, name):
+        return np.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+
+    # Rows (of the given ones, or of every entity) whose entities have all of the given components
+    # Optionally only those with hit points left, and those in the field of view
+    def rows_with(self, components, rows=None, fov_map=None, living=False):
+        if rows is None:
+            rows = np.arange(len(self.entities))
+
+        mask = (self.column('signature')[rows] & components) == components
+
+        if living:
+            mask &= self.column('hp')[rows] > 0
+
+        if fov_map is not None:
+            mask &= fov_map.fov[self.column('x')[rows], self.column('y')[rows]]
+
+        return rows[mask]
+
+    # Squared distances of the rows' entities from a tile
+    def distances_squared(self, rows, x, y):
+        dx = self.column('x')[rows] - x
+        dy = self.column('y')[rows] - y
+        return dx * dx + dy * dy
+
+    def entities_at(self, rows):
+        entities = self.entities
+        return [entities[row] for row in rows]
+
+    # Entities with all of the given components, in list order
+    # Optionally only those with hit points left, and those in the field of view
+    def select(self, components, fov_map=None, living=False):
+        return self.entities_at(self.rows_with(components, fov_map=fov_map, living=living))
+
+    # Entities inside a rectangle of the map, sorted by render order (ties keep list order)
+    def in_render_order(self, x, y, width, height):
+        if not self.entities:
+            return []
+
+        xs = self.column('x')
+        ys = self.column('y')
+
+        rows = np.flatnonzero((xs >= x) & (xs < x + width) & (ys >= y) & (ys < y + height))
+        return self.entities_at(rows[np.argsort(self.column('render_order')[rows], kind='stable')])
+
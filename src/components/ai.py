@@ -1,7 +1,8 @@
 import tcod
-from random import randint
 
 from src.game_messages import Message
+from src.slotted import Slotted
+from src.turn_results import LogMessage
 
 """
     Monster AI
@@ -9,15 +10,27 @@ from src.game_messages import Message
 
 
 # Regular monster state
-class BasicMonster:
-    def take_turn(self, target, fov_map, game_map, entities):
+# With use_flow_field, monsters chasing during the enemy phase share one distance field instead of each running A*
+class BasicMonster(Slotted):
+    __slots__ = ('owner', 'use_flow_field')
+
+    def __init__(self, use_flow_field=True):
+        self.owner = None
+        self.use_flow_field = use_flow_field
+
+    # Saves made before the flow field don't have the flag
+    def __setstate__(self, state):
+        super().__setstate__({'use_flow_field': True, **state})
+
+    def take_turn(self, target, fov_map, game_map, entities, pathing=None):
         results = []
 
         monster = self.owner
         if tcod.map_is_in_fov(fov_map, monster.x, monster.y):
 
             if monster.distance_to(target) >= 2:
-                monster.move_astar(target, entities, game_map)
+                if not (self.use_flow_field and pathing and monster.move_flow_field(target, pathing)):
+                    monster.move_astar(target, entities, game_map, pathing)
 
             elif target.fighter.hp > 0:
                 attack_results = monster.fighter.attack(target)
@@ -27,24 +40,28 @@ class BasicMonster:
 
 
 # Monster is confused
-class ConfusedMonster:
+class ConfusedMonster(Slotted):
+    __slots__ = ('owner', 'previous_ai', 'number_of_turns')
+
     def __init__(self, previous_ai, number_of_turns=10):
+        self.owner = None
         self.previous_ai = previous_ai
         self.number_of_turns = number_of_turns
 
-    def take_turn(self, target, fov_map, game_map, entities):
+    def take_turn(self, target, fov_map, game_map, entities, pathing=None):
         results = []
 
         if self.number_of_turns > 0:
+            randint = game_map.rng.ai.randint
             random_x = self.owner.x + randint(0, 2) - 1
             random_y = self.owner.y + randint(0, 2) - 1
 
             if random_x != self.owner.x and random_y != self.owner.y:
-                self.owner.move_towards(random_x, random_y, game_map, entities)
+                self.owner.move_towards(random_x, random_y, game_map, entities, pathing)
 
             self.number_of_turns -= 1
         else:
             self.owner.ai = self.previous_ai
-            results.append({'message': Message('The {0} is no longer confused!'.format(self.owner.name), tcod.red)})
+            results.append(LogMessage(Message('The {0} is no longer confused!'.format(self.owner.name), tcod.red)))
 
         return results
@@ -1,21 +1,68 @@
 import tcod
 
+from src.component_store import FIGHTER_COLUMNS, StoredStat
 from src.game_messages import Message
+from src.slotted import Slotted
+from src.turn_results import Died, LogMessage
 
 """
     Fighter component stats and abilities
     Note that enemies draw from this as well
+    The stats live in the floor's component store while the fighter's entity is on a floor
 """
 
 
-class Fighter:
+class Fighter(Slotted):
+    __slots__ = ('store', 'row', 'owner') + tuple('_' + name for name in FIGHTER_COLUMNS)
+
+    max_hp = StoredStat()
+    hp = StoredStat()
+    defense = StoredStat()
+    power = StoredStat()
+    xp = StoredStat()
+
     def __init__(self, hp, defense, power, xp=0):
+        # Set by the component store while the owner is on a floor
+        self.store = None
+        self.row = None
+        self.owner = None
         self.max_hp = hp
         self.hp = hp
         self.defense = defense
         self.power = power
         self.xp = xp
 
+    # The store belongs to the floor, the stats are saved with the fighter
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update({'_' + name: getattr(self, name) for name in FIGHTER_COLUMNS})
+        state.update({'store': None, 'row': None})
+        return state
+
+    # Converts saves made before the component store
+    def __setstate__(self, state):
+        state = dict(state)
+
+        for name in FIGHTER_COLUMNS:
+            if name in state:
+                state['_' + name] = state.pop(name)
+
+        state.update({'store': None, 'row': None})
+        super().__setstate__(state)
+
+    # A copy with the same stats, on no floor
+    def copy(self):
+        fighter = Fighter.__new__(Fighter)
+        fighter.store = fighter.row = None
+        fighter.owner = self.owner
+        fighter._max_hp = self.max_hp
+        fighter._hp = self.hp
+        fighter._defense = self.defense
+        fighter._power = self.power
+        fighter._xp = self.xp
+
+        return fighter
+
     # Taking damage functionality
     def take_damage(self, amount):
         results = []
@@ -23,7 +70,7 @@ class Fighter:
         self.hp -= amount
 
         if self.hp <= 0:
-            results.append({'dead': self.owner, 'xp': self.xp})
+            results.append(Died(self.owner, self.xp))
 
         return results
 
@@ -42,10 +89,10 @@ class Fighter:
 
         if damage > 0:
             target.fighter.take_damage(damage)
-            results.append({'message': Message('{0} attacks {1} for {2} hit points.'.format(
-                self.owner.name.capitalize(), target.name, str(damage)), tcod.white)})
+            results.append(LogMessage(Message('{0} attacks {1} for {2} hit points.'.format(
+                self.owner.name.capitalize(), target.name, str(damage)), tcod.white)))
             results.extend(target.fighter.take_damage(damage))
         else:
-            results.append({'message': Message('{0} attacks {1} but does no damage.'.format(
-                self.owner.name.capitalize(), target.name), tcod.white)})
+            results.append(LogMessage(Message('{0} attacks {1} but does no damage.'.format(
+                self.owner.name.capitalize(), target.name), tcod.white)))
         return results
@@ -1,6 +1,7 @@
 import tcod
 
 from src.game_messages import Message
+from src.turn_results import ItemAdded, ItemConsumed, ItemDropped, LogMessage, TargetingStarted
 
 """
     Handles player inventory
@@ -14,21 +15,24 @@ class Inventory:
         self.capacity = capacity
         self.items = []
 
+    # Copies carry items of their own
+    def __copy__(self):
+        copied = Inventory.__new__(Inventory)
+        copied.__dict__.update(self.__dict__)
+        copied.items = list(self.items)
+
+        return copied
+
     # Adds item to the player's inventory if not full
     def add_item(self, item):
         results = []
 
         if len(self.items) >= self.capacity:
-            results.append({
-                'item_added': None,
-                'message': Message('You cannot carry any more, your inventory is full', tcod.yellow)
-            })
+            results.append(LogMessage(Message('You cannot carry any more, your inventory is full', tcod.yellow)))
         else:
-            results.append({
-                'item_added': item,
-                'message': Message('You pick up the {0} and place it in your inventory'.format(item.name),
-                                   tcod.blue)
-            })
+            results.append(LogMessage(Message('You pick up the {0} and place it in your inventory'.format(item.name),
+                                              tcod.blue)))
+            results.append(ItemAdded(item))
 
             self.items.append(item)
 
@@ -41,17 +45,17 @@ class Inventory:
         item_component = item_entity.item
 
         if item_component.use_function is None:
-            results.append({'message': Message('The {0} cannot be used.'.format(item_entity.name), tcod.yellow)})
+            results.append(LogMessage(Message('The {0} cannot be used.'.format(item_entity.name), tcod.yellow)))
         else:
             # Determines if targeting is true or not and if the coords were passed
             if item_component.targeting and not (kwargs.get('target_x') or kwargs.get('target_y')):
-                results.append({'targeting': item_entity})
+                results.append(TargetingStarted(item_entity))
             else:
                 kwargs = {**item_component.function_kwargs, **kwargs}
                 item_use_results = item_component.use_function(self.owner, **kwargs)
 
                 for item_use_result in item_use_results:
-                    if item_use_result.get('consumed'):
+                    if type(item_use_result) is ItemConsumed:
                         self.remove_item(item_entity)
 
                 results.extend(item_use_results)
@@ -70,7 +74,7 @@ class Inventory:
         item.y = self.owner.y
 
         self.remove_item(item)
-        results.append({'item_dropped': item, 'message': Message('You dropped the {0}.'.format(item.name),
-                                                                 tcod.yellow)})
+        results.append(LogMessage(Message('You dropped the {0}.'.format(item.name), tcod.yellow)))
+        results.append(ItemDropped(item))
 
         return results
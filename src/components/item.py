@@ -1,10 +1,15 @@
+from src.slotted import Slotted
+
 """
     Item class that defines their functional usage
 """
 
 
-class Item:
+class Item(Slotted):
+    __slots__ = ('owner', 'use_function', 'targeting', 'targeting_message', 'function_kwargs')
+
     def __init__(self, use_function=None, targeting=False, targeting_message=None, **kwargs):
+        self.owner = None
         self.use_function = use_function
         self.targeting = targeting
         self.targeting_message = targeting_message
@@ -18,7 +18,13 @@ def kill_player(player):
 
 def kill_monster(monster):
     death_message = Message('{0} is dead!'.format(monster.name.capitalize()), tcod.orange)
+    make_corpse(monster)
 
+    return death_message
+
+
+# Turns a monster into its remains
+def make_corpse(monster):
     monster.char = '%'
     monster.color = tcod.dark_red
     monster.blocks = False
@@ -26,5 +32,3 @@ def kill_monster(monster):
     monster.ai = None
     monster.name = 'remains of ' + monster.name
     monster.render_order = RenderOrder.CORPSE
-
-    return death_message
@@ -1,15 +1,20 @@
+import os
+import time
+
 import tcod
 
+from src.camera import Camera
 from src.components.menus import main_menu, message_box
-from src.death_functions import kill_monster, kill_player
-from src.entity import get_blocking_entities_at_location
-from src.fov_functions import initialize_fov, recompute_fov
-from src.game_messages import Message
+from src.frame_profiler import FrameProfiler, draw_profiler
 from src.game_states import GameStates
-from src.input_handlers import handle_keys, handle_main_menu, handle_mouse
-from src.loader_functions.data_loaders import load_game, save_game
+from src.input_handlers import handle_debug_keys, handle_keys, handle_main_menu, handle_mouse, wait_for_input
+from src.loader_functions.data_loaders import NEW_GAME_PATH, SAVE_PATH, delete_save, load_game, save_game
 from src.loader_functions.initialize_new_game import get_game_constants, get_game_variables
-from src.render_functions import clear_all, render_all
+from src.loader_functions.journal import Journal, journal_path_for
+from src.render_functions import RenderCache, render_all
+from src.tracing import Tracer
+from src.turn_results import ExitRequested, FloorChanged
+from src.turn_engine import TurnEngine
 
 # TODO add message of what is at player's feet
 
@@ -18,275 +23,168 @@ from src.render_functions import clear_all, render_all
 """
 
 
-# Logic of main game
-def play_game(player, entities, game_map, message_log, game_state, con, panel, constants):
-    # Field of view variables
-    fov_recompute = True                    # We only need to recompute when character moves
-    fov_map = initialize_fov(game_map)
-
-    # Variables for keyboard and mouse inputs
-    key = tcod.Key()
-    mouse = tcod.Mouse()
-
+# Front end for the game - waits for input, draws the screen and hands actions to the turn engine
+# Crash recovery snapshots go to save_path, saving and quitting always writes the save
+# fresh_game is set for a game just started rather than loaded
+def play_game(player, entities, game_map, message_log, game_state, con, panel, constants, save_path=SAVE_PATH,
+              fresh_game=False):
     # Player goes first
-    game_state = GameStates.PLAYERS_TURN
+    engine = TurnEngine(player, entities, game_map, message_log, GameStates.PLAYERS_TURN, constants)
 
-    # Save previous game state (for inventory support)
-    previous_game_state = game_state
+    # Follows the player around maps bigger than the screen
+    camera = Camera(constants['viewport_width'], constants['viewport_height'])
 
-    # Saves targeting item
-    targeting_item = None
+    # Crash recovery - a full save to start from, then every action is journaled until the next one
+    journal = Journal(journal_path_for(save_path))
+    journal.begin(save_game(engine.player, engine.entities, engine.game_map, engine.message_log, engine.game_state,
+                            save_path))
+    played = False
 
-    # Main game loop
-    while not tcod.console_is_window_closed():
-        tcod.sys_check_for_event(tcod.EVENT_KEY_PRESS | tcod.EVENT_MOUSE, key, mouse)
-
-        # Updates field of view if needed
-        if fov_recompute:
-            recompute_fov(fov_map, player.x, player.y, constants['fov_radius'], constants['fov_light_walls'],
-                          constants['fov_algorithm'])
-
-        # Draws player and sets recompute to false until next player move
-        render_all(con, panel, entities, player, game_map, fov_map, fov_recompute, message_log,
-                   constants['screen_width'], constants['screen_height'], constants['bar_width'],
-                   constants['panel_height'], constants['panel_y'], mouse, constants['colors'], game_state)
-        fov_recompute = False
-        tcod.console_flush()
-
-        # Updates spot last at with a blank (avoids multiple @'s)
-        clear_all(con, entities)
-
-        # Keyboard and mouse inputs
-        action = handle_keys(key, game_state)
-        mouse_action = handle_mouse(mouse)
-
-        # TODO add in help menu that lists commands, available both through menu and by hitting '?'
-        # Action handlers
-        move = action.get('move')
-        wait = action.get('wait')
-        pickup = action.get('pickup')
-        show_inventory = action.get('show_inventory')
-        drop_inventory = action.get('drop_inventory')
-        inventory_index = action.get('inventory_index')
-        level_up = action.get('level_up')
-        show_character_screen = action.get('show_character_screen')
-        # TODO add in take_stairs_up
-        take_stairs_down = action.get('take_stairs_down')
-        exit = action.get('exit')
-        fullscreen = action.get('fullscreen')
-
-        # Mouse action handlers
-        left_click = mouse_action.get('left_click')
-        right_click = mouse_action.get('right_click')
-
-        # List to hold for result of battles
-        player_turn_results = []
-
-        # Player turn and handling of item pickups
-        if move and game_state == GameStates.PLAYERS_TURN:
-            dx, dy = move
-            destination_x = player.x + dx
-            destination_y = player.y + dy
-
-            if not game_map.is_blocked(destination_x, destination_y):
-                target = get_blocking_entities_at_location(entities, destination_x, destination_y)
-
-                if target:
-                    attack_results = player.fighter.attack(target)
-                    player_turn_results.extend(attack_results)
-                else:
-                    player.move(dx, dy)
-                    fov_recompute = True
-
-                game_state = GameStates.ENEMY_TURN
-
-        # Player waits for a turn (and does nothing)
-        elif wait and game_state == GameStates.PLAYERS_TURN:
-            message_log.add_message(Message('You twiddle your thumbs for a turn.', tcod.turquoise))
-            game_state = GameStates.ENEMY_TURN
-
-        # Pickup items
-        elif pickup and game_state == GameStates.PLAYERS_TURN:
-            for entity in entities:
-                if entity.item and entity.x == player.x and entity.y == player.y:
-                    pickup_results = player.inventory.add_item(entity)
-                    player_turn_results.extend(pickup_results)
-
-                    break
-            else:
-                message_log.add_message(Message('There is nothing here to pick up.', tcod.yellow))
-
-        # Show inventory
-        if show_inventory:
-            previous_game_state = game_state
-            game_state = GameStates.SHOW_INVENTORY
-
-        # Drops item from inventory
-        if drop_inventory:
-            previous_game_state = game_state
-            game_state = GameStates.DROP_INVENTORY
-
-        # Use or drop item (only when in inventory game state and not dead)
-        if inventory_index is not None and previous_game_state != GameStates.PLAYER_DEAD and inventory_index < len(
-                player.inventory.items):
-            item = player.inventory.items[inventory_index]
-
-            if game_state == GameStates.SHOW_INVENTORY:
-                player_turn_results.extend(player.inventory.use(item, entities=entities, fov_map=fov_map))
-            elif game_state == GameStates.DROP_INVENTORY:
-                player_turn_results.extend(player.inventory.drop_item(item))
-
-        # Leveling up
-        if level_up:
-            if level_up == 'hp':
-                player.fighter.max_hp += 20
-                player.fighter.hp += 20
-            elif level_up == 'str':
-                player.fighter.power += 1
-            elif level_up == 'def':
-                player.fighter.defense += 1
-
-            game_state = previous_game_state
-
-        # Character screen, switches to appropriate game state
-        if show_character_screen:
-            previous_game_state = game_state
-            game_state = GameStates.CHARACTER_SCREEN
-
-        # TODO will likely need to add a stairs_down and stairs_up to entities when making going up floors
-        # Goes down a flight of stairs, going to a new map
-        if take_stairs_down and game_state == GameStates.PLAYERS_TURN:
-            for entity in entities:
-                if entity.stairs and entity.x == player.x and entity.y == player.y:
-                    entities = game_map.next_floor(player, message_log, constants)
-                    fov_map = initialize_fov(game_map)
-                    fov_recompute = True
-                    tcod.console_clear(con)
+    # Variables for keyboard and mouse inputs
+    key = tcod.Key()
+    mouse = tcod.Mouse()
 
-                    break
-            else:
-                message_log.add_message(Message('There are no stairs here.', tcod.yellow))
-
-        # Targeting mode is active - left mouse click sets target, right mouse click cancels
-        if game_state == GameStates.TARGETING:
-            if left_click:
-                target_x, target_y = left_click
-
-                item_use_results = player.inventory.use(targeting_item, entities=entities, fov_map=fov_map,
-                                                        target_x=target_x, target_y=target_y)
-                player_turn_results.extend(item_use_results)
-            elif right_click:
-                player_turn_results.append({'targeting_cancelled': True})
-
-        # Reverts back to previous game state while viewing inventory; otherwise, closes and saves game
-        if exit:
-            if game_state in (GameStates.SHOW_INVENTORY, GameStates.DROP_INVENTORY, GameStates.CHARACTER_SCREEN):
-                game_state = previous_game_state
-            elif game_state == GameStates.TARGETING:
-                player_turn_results.append({'targeting_cancelled': True})
-            else:
-                save_game(player, entities, game_map, message_log, game_state)
-
-                return True
-
-        # Toggles fullscreen
-        if fullscreen:
-            tcod.console_set_fullscreen(not tcod.console_is_fullscreen())
-
-        # Iterates results after turn
-        for player_turn_result in player_turn_results:
-            message = player_turn_result.get('message')
-            dead_entity = player_turn_result.get('dead')
-            item_added = player_turn_result.get('item_added')
-            item_consumed = player_turn_result.get('consumed')
-            item_dropped = player_turn_result.get('item_dropped')
-            targeting = player_turn_result.get('targeting')
-            targeting_cancelled = player_turn_result.get('targeting_cancelled')
-            xp = player_turn_result.get('xp')
-
-            # Displays supplied message
-            if message:
-                message_log.add_message(message)
-
-            # Player or monster has died
-            if dead_entity:
-                if dead_entity == player:
-                    message, game_state = kill_player(dead_entity)
+    # The screen is only drawn again when something changed, between inputs the loop sleeps
+    # Even then only the tiles and panel that changed are drawn
+    redraw = True
+    render_cache = RenderCache()
+    mouse_cell = None
+
+    # Times the phases of each frame, shown over the screen with F3
+    profiler = FrameProfiler()
+    engine.profiler = profiler
+
+    # Main game loop - however it ends, the floor pregenerator is stopped and a trace in progress is saved
+    try:
+        while not tcod.console_is_window_closed():
+            if redraw:
+                if engine.tracer:
+                    engine.tracer.begin('render', 'frame')
+
+                # The map has to be redrawn whenever the camera scrolls
+                camera_moved = camera.update(engine.player, engine.game_map)
+
+                # Draws player and sets recompute to false until next player move
+                render_all(con, panel, engine.entities, engine.player, engine.game_map, engine.fov_map,
+                           engine.fov_recompute or camera_moved, engine.message_log, constants['screen_width'],
+                           constants['screen_height'], constants['bar_width'], constants['panel_height'],
+                           constants['panel_y'], mouse, constants['colors'], engine.game_state, camera, render_cache,
+                           profiler)
+                engine.fov_recompute = False
+
+                if profiler.visible:
+                    draw_profiler(profiler, constants['screen_width'])
+
+                start = time.perf_counter()
+                tcod.console_flush()
+                profiler.add('flush', time.perf_counter() - start)
+                profiler.end_frame()
+
+                if engine.tracer:
+                    engine.tracer.end()
+
+                redraw = False
+
+            wait_for_input(key, mouse)
+
+            # Debug keys only change what is shown, they never reach the engine or the journal
+            debug_action = handle_debug_keys(key)
+
+            if debug_action.get('toggle_profiler'):
+                profiler.visible = not profiler.visible
+                redraw = True
+                continue
+
+            if debug_action.get('dump_profile'):
+                profiler.dump()
+                redraw = True
+                continue
+
+            # Tracing starts on the next step, stopping it saves the trace
+            if debug_action.get('toggle_trace'):
+                if engine.tracer:
+                    engine.tracer.save()
+                    engine.tracer = None
                 else:
-                    message = kill_monster(dead_entity)
+                    engine.tracer = Tracer()
 
-                message_log.add_message(message)
+                continue
 
-            # Item was added to inventory
-            if item_added:
-                entities.remove(item_added)
+            if engine.tracer:
+                engine.tracer.begin('input', 'phase')
 
-                game_state = GameStates.ENEMY_TURN
+            # Keyboard and mouse inputs
+            action = handle_keys(key, engine.game_state)
+            mouse_action = handle_mouse(mouse)
 
-            # Item was used
-            if item_consumed:
-                game_state = GameStates.ENEMY_TURN
+            # Clicks are in screen coordinates, the engine works in map coordinates
+            for click in ('left_click', 'right_click'):
+                if click in mouse_action:
+                    mouse_action[click] = camera.to_map(*mouse_action[click])
 
-            # Item was dropped
-            if item_dropped:
-                entities.append(item_dropped)
-
-                game_state = GameStates.ENEMY_TURN
+            # TODO add in help menu that lists commands, available both through menu and by hitting '?'
+            # Toggles fullscreen
+            if action.get('fullscreen'):
+                tcod.console_set_fullscreen(not tcod.console_is_fullscreen())
 
-            # Targeting is activated, switch to targeting mode
-            if targeting:
-                previous_game_state = GameStates.PLAYERS_TURN
-                game_state = GameStates.TARGETING
+            # Runs the player's action and the enemy phase - waking up for nothing (the mouse moved) is no turn,
+            # and leaves nothing in the trace
+            action = {**action, **mouse_action}
 
-                targeting_item = targeting
+            if engine.tracer:
+                if action:
+                    engine.tracer.end()
+                else:
+                    engine.tracer.cancel()
 
-                message_log.add_message(targeting_item.item.targeting_message)
+            results = engine.step(action) if action else []
 
-            # Targeting was cancelled, revert to previous game state
-            if targeting_cancelled:
-                game_state = previous_game_state
+            for result in results:
+                # Went down the stairs, wipe the old floor from the screen
+                if type(result) is FloorChanged:
+                    tcod.console_clear(con)
+                    render_cache.panel = None
 
-                message_log.add_message(Message('Targeting cancelled.'))
+                # Closes and saves game, the journal starts over empty on top of the save
+                # A new game has a save of its own from here on - its snapshots go only once that is written,
+                # so a save that fails leaves them to recover from
+                if type(result) is ExitRequested:
+                    journal.close()
 
-            # Experience results
-            if xp:
-                leveled_up = player.level.add_xp(xp)
-                message_log.add_message(Message('You gain {0} experience points.'.format(xp)))
+                    journal = Journal()
+                    journal.begin(save_game(engine.player, engine.entities, engine.game_map, engine.message_log,
+                                            engine.game_state))
+                    journal.close()
 
-                if leveled_up:
-                    message_log.add_message(Message('You have leveled up and reached level {0}!'.format(
-                        player.level.current_level), tcod.green))
-                    previous_game_state = game_state
-                    game_state = GameStates.LEVEL_UP
+                    if save_path != SAVE_PATH:
+                        delete_save(save_path)
 
-        # Enemies turn
-        if game_state == GameStates.ENEMY_TURN:
-            for entity in entities:
-                if entity.ai:
-                    enemy_turn_results = entity.ai.take_turn(player, fov_map, game_map, entities)
+                    return True
 
-                    for enemy_turn_result in enemy_turn_results:
-                        message = enemy_turn_result.get('message')
-                        dead_entity = enemy_turn_result.get('dead')
+            if action:
+                journal.record(action, engine)
+                played = True
 
-                        if message:
-                            message_log.add_message(message)
+            # Anything the player did shows, and moving the mouse onto another cell changes the names under it
+            if action or (mouse.cx, mouse.cy) != mouse_cell:
+                mouse_cell = (mouse.cx, mouse.cy)
+                redraw = True
 
-                        if dead_entity:
-                            if dead_entity == player:
-                                message, game_state = kill_player(dead_entity)
-                            else:
-                                message = kill_monster(dead_entity)
+            # Takes a new snapshot every so often (only between turns), so the journal never gets long
+            if journal.length >= constants['snapshot_interval'] and engine.game_state == GameStates.PLAYERS_TURN:
+                journal.begin(save_game(engine.player, engine.entities, engine.game_map, engine.message_log,
+                                        engine.game_state, save_path))
 
-                            message_log.add_message(message)
+        # The window was closed, the journal is left for crash recovery - unless a new game was closed before it began
+        journal.close()
+        if fresh_game and not played:
+            delete_save(save_path)
+    finally:
+        if engine.pregenerator:
+            engine.pregenerator.close()
 
-                            if game_state == GameStates.PLAYER_DEAD:
-                                break
-
-                    if game_state == GameStates.PLAYER_DEAD:
-                        break
-            else:
-                game_state = GameStates.PLAYERS_TURN
+        if engine.tracer:
+            engine.tracer.save()
 
 
 def main():
@@ -308,6 +206,8 @@ def main():
     game_map = None
     message_log = None
     game_state = None
+    save_path = SAVE_PATH
+    fresh_game = False
 
     # Menu and Load triggers
     show_main_menu = True
@@ -320,23 +220,30 @@ def main():
     key = tcod.Key()
     mouse = tcod.Mouse()
 
+    # The menu is drawn again only after a key press
+    redraw = True
+
     #
     # MAIN GAME LOOP
     #
     while not tcod.console_is_window_closed():
-        # Check for events
-        tcod.sys_check_for_event(tcod.EVENT_KEY_PRESS | tcod.EVENT_MOUSE, key, mouse)
-
         # Main menu
         if show_main_menu:
-            main_menu(con, main_menu_background_image, constants['screen_width'], constants['screen_height'])
+            if redraw:
+                main_menu(con, main_menu_background_image, constants['screen_width'], constants['screen_height'])
 
-            if show_load_error_message:
-                message_box(con, 'No save game to load', 50, constants['screen_width'], constants['screen_height'])
+                if show_load_error_message:
+                    message_box(con, 'No save game to load', 50, constants['screen_width'],
+                                constants['screen_height'])
 
-            tcod.console_flush()
+                tcod.console_flush()
+                redraw = False
+
+            # Check for events
+            wait_for_input(key, mouse)
 
             action = handle_main_menu(key)
+            redraw = bool(action)
 
             # Actions for main menu
             new_game = action.get('new_game')
@@ -352,13 +259,20 @@ def main():
                 # Loads in player, inventory, map, and other such variables then sets turn to player
                 player, entities, game_map, message_log, game_state = get_game_variables(constants)
                 game_state = GameStates.PLAYERS_TURN
+                save_path = NEW_GAME_PATH
+                fresh_game = True
 
                 show_main_menu = False
 
             # Loads a saved game
             elif load_saved_game:
+                # A new game that closed before it was ever saved is the game last played
+                save_path = NEW_GAME_PATH if os.path.isfile(NEW_GAME_PATH) else SAVE_PATH
+                fresh_game = False
+
                 try:
-                    player, entities, game_map, message_log, game_state = load_game()
+                    player, entities, game_map, message_log, game_state = load_game(
+                        save_path, journal_path=journal_path_for(save_path))
                     show_main_menu = False
                 except FileNotFoundError:
                     show_load_error_message = True
@@ -373,9 +287,11 @@ def main():
 
         else:
             tcod.console_clear(con)
-            play_game(player, entities, game_map, message_log, game_state, con, panel, constants)
+            play_game(player, entities, game_map, message_log, game_state, con, panel, constants, save_path,
+                      fresh_game)
 
             show_main_menu = True
+            redraw = True
 
 
 if __name__ == '__main__':
@@ -1,18 +1,48 @@
+import copy
 import math
+
 import tcod
 
+from src.component_store import AI, BLOCKS, FIGHTER, INVENTORY, ITEM, LEVEL, STAIRS, component_slot
+from src.map_objects.pathing import PathingGrid
 from src.render_functions import RenderOrder
+from src.slotted import Slotted
 
 """
 A generic object to represent players, enemies, items, etc.
+While it is on a floor its position, render order and fighter stats live in the floor's component store
+(see component_store.py), the attributes below read and write through to it.
 """
 
+# Components tracked in the store's signature column
+COMPONENT_SLOTS = (('blocks', BLOCKS), ('fighter', FIGHTER), ('ai', AI), ('item', ITEM), ('inventory', INVENTORY),
+                   ('stairs', STAIRS), ('level', LEVEL))
+
+# Slots of the components that are objects (blocks is a flag)
+COMPONENT_NAMES = tuple('_' + name for name, bit in COMPONENT_SLOTS if name != 'blocks')
+
+
+class Entity(Slotted):
+    __slots__ = ('spatial_index', 'store', 'row', '_x', '_y', 'char', 'color', 'name', '_render_order', 'prototype') + \
+        tuple('_' + name for name, bit in COMPONENT_SLOTS)
+
+    blocks = component_slot('blocks', BLOCKS)
+    fighter = component_slot('fighter', FIGHTER)
+    ai = component_slot('ai', AI)
+    item = component_slot('item', ITEM)
+    inventory = component_slot('inventory', INVENTORY)
+    stairs = component_slot('stairs', STAIRS)
+    level = component_slot('level', LEVEL)
 
-class Entity:
     def __init__(self, x, y, char, color, name, blocks=False, render_order=RenderOrder.CORPSE, fighter=None, ai=None,
-                 item=None, inventory=None, stairs=None, level=None):
-        self.x = x
-        self.y = y
+                 item=None, inventory=None, stairs=None, level=None, prototype=None):
+        # Set by the EntityList the entity is placed in, kept up to date whenever the entity moves
+        self.spatial_index = None
+        # Set by the EntityList too, the store and row holding the entity's fields
+        self.store = None
+        self.row = None
+        self._x = x
+        self._y = y
         self.char = char
         self.color = color
         self.name = name
@@ -24,6 +54,8 @@ class Entity:
         self.inventory = inventory
         self.stairs = stairs
         self.level = level
+        # Name of the prototype the entity was spawned from (see prototypes.py)
+        self.prototype = prototype
 
         if self.fighter:
             self.fighter.owner = self
@@ -43,13 +75,111 @@ class Entity:
         if self.level:
             self.level.owner = self
 
+    @property
+    def x(self):
+        store = self.store
+        return self._x if store is None else store.x[self.row]
+
+    @x.setter
+    def x(self, value):
+        self.move(value - self.x, 0)
+
+    @property
+    def y(self):
+        store = self.store
+        return self._y if store is None else store.y[self.row]
+
+    @y.setter
+    def y(self, value):
+        self.move(0, value - self.y)
+
+    @property
+    def render_order(self):
+        store = self.store
+        return self._render_order if store is None else RenderOrder(store.render_order[self.row])
+
+    @render_order.setter
+    def render_order(self, value):
+        if self.store is None:
+            self._render_order = value
+        else:
+            self.store.render_order[self.row] = value.value
+
+        if self.spatial_index:
+            self.spatial_index.touch(self)
+
+    # The spatial index and store belong to the floor, they are rebuilt when the entities are loaded
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update({'spatial_index': None, 'store': None, 'row': None, '_x': self.x, '_y': self.y,
+                      '_render_order': self.render_order})
+        return state
+
+    # Converts saves made before positions were indexed, and before the component store
+    def __setstate__(self, state):
+        state = dict(state)
+
+        if 'x' in state:
+            state['_x'] = state.pop('x')
+            state['_y'] = state.pop('y')
+
+        for name in [name for name, bit in COMPONENT_SLOTS] + ['render_order']:
+            if name in state:
+                state['_' + name] = state.pop(name)
+
+        state.setdefault('spatial_index', None)
+        state.setdefault('prototype', None)
+        state.update({'store': None, 'row': None})
+        super().__setstate__(state)
+
+    # A new entity like this one at another tile, with copies of its components and on no floor yet
+    # Much cheaper than building one from its prototype, for loading many entities of the same kind
+    def copy_at(self, x, y):
+        if self.store is not None:
+            raise ValueError('{0} is on a floor, only entities on none can be copied'.format(self.name))
+
+        entity = Entity.__new__(Entity)
+        entity.spatial_index = entity.store = entity.row = None
+        entity._x = x
+        entity._y = y
+        entity.char = self.char
+        entity.color = self.color
+        entity.name = self.name
+        entity._render_order = self._render_order
+        entity.prototype = self.prototype
+        entity._blocks = self._blocks
+
+        for name in COMPONENT_NAMES:
+            component = getattr(self, name)
+
+            if component is not None:
+                component = component.copy() if isinstance(component, Slotted) else copy.copy(component)
+                component.owner = entity
+
+            setattr(entity, name, component)
+
+        return entity
+
     # Move the entity by a given amount
     def move(self, dx, dy):
-        self.x += dx
-        self.y += dy
+        store = self.store
+
+        if store is None:
+            old_x, old_y = self._x, self._y
+            self._x += dx
+            self._y += dy
+        else:
+            row = self.row
+            old_x, old_y = store.x[row], store.y[row]
+            store.x[row] = old_x + dx
+            store.y[row] = old_y + dy
+
+        if self.spatial_index:
+            self.spatial_index.move(self, old_x, old_y)
 
     # Moves the entity towards a target
-    def move_towards(self, target_x, target_y, game_map, entities):
+    # The shared pathing grid is used (and kept up to date) during the enemy phase
+    def move_towards(self, target_x, target_y, game_map, entities, pathing=None):
         dx = target_x - self.x
         dy = target_y - self.y
         distance = math.sqrt(dx ** 2 + dy ** 2)
@@ -57,8 +187,12 @@ class Entity:
         dx = int(round(dx / distance))
         dy = int(round(dy / distance))
 
-        if not (game_map.is_blocked(self.x + dx, self.y + dy) or
-                get_blocking_entities_at_location(entities, self.x + dx, self.y + dy)):
+        if pathing:
+            if not pathing.is_blocked(self.x + dx, self.y + dy):
+                pathing.move(self.x, self.y, self.x + dx, self.y + dy)
+                self.move(dx, dy)
+        elif not (game_map.is_blocked(self.x + dx, self.y + dy) or
+                  get_blocking_entities_at_location(entities, self.x + dx, self.y + dy)):
             self.move(dx, dy)
 
     # Get distance between a entity and the player
@@ -66,51 +200,45 @@ class Entity:
         return math.sqrt((x - self.x) ** 2 + (y - self.y) ** 2)
 
     # Moves using the A* algorithm
-    # noinspection DuplicatedCode
-    def move_astar(self, target, entities, game_map):
-        # Create a field of view map that has all dimensions of map
-        fov = tcod.map_new(game_map.width, game_map.height)
-
-        # Scans current map each turn and sets walls as un-walkable
-        for y1 in range(game_map.height):
-            for x1 in range(game_map.width):
-                tcod.map_set_properties(fov, x1, y1, not game_map.tiles[x1][y1].block_sight,
-                                        not game_map.tiles[x1][y1].blocked)
-
-        # Scan all objects to see if there are objects that must be navigated around
-        # Check also that the object isn't self or the target (so start and end points are free)
-        # The AI class handles it if self is next to target so it will not use this function anyhow
-        for entity in entities:
-            if entity.blocks and entity != self and entity != target:
-                # Set the tile as if it was a wall so it must be navigated around
-                tcod.map_set_properties(fov, entity.x, entity.y, True, False)
-
-        # Allocate a A* path
-        # The 1.41 is the normal diagonal cost of moving, it can be set to 0.0 if diagonals are prohibited
-        my_path = tcod.path_new_using_map(fov, 1.41)
+    def move_astar(self, target, entities, game_map, pathing=None):
+        # Without a shared grid (i.e. outside of the enemy phase) build one just for this move
+        if pathing is None:
+            pathing = PathingGrid(game_map, entities)
 
         # Compute the path between self's coords and the target's coords
-        tcod.path_compute(my_path, self.x, self.y, target.x, target.y)
+        # Other blocking entities are already marked on the grid so they are navigated around
+        path = pathing.get_path(self, target)
 
         # Check if the path exists, and in this case, also that the path is shorter than 25 tiles
         # This path size matters if you want monster to use alternative longer paths (for example through other rooms)
         # if for example, the player is in a corridor.
         # It makes sense to keep path size relatively low to keep monsters from running around the map if there's an
         # alternate path really far away.
-        if not tcod.path_is_empty(my_path) and tcod.path_size(my_path) < 25:
-            # Find the next coords in the computed full path
-            x, y = tcod.path_walk(my_path, True)
-            if x or y:
-                # Set self's coords to the next path tile
-                self.x = x
-                self.y = y
+        if path and len(path) < 25:
+            # Set self's coords to the next path tile
+            x, y = path[0]
+            pathing.move(self.x, self.y, x, y)
+            self.move(x - self.x, y - self.y)
         else:
             # Keep old move function as a back so that if there are no paths (i.e. another monster blocks a corridor).
             # It will still try to move towards the player (closer to the corridor opening)
-            self.move_towards(target.x, target.y, game_map, entities)
+            self.move_towards(target.x, target.y, game_map, entities, pathing)
+
+    # Steps down the shared distance field towards the target
+    # Returns False if the target can't be reached that way, so the caller can fall back to A*
+    def move_flow_field(self, target, pathing):
+        if tcod.dijkstra_get_distance(pathing.distance_field(target), self.x, self.y) < 0:
+            return False
 
-            # Delete path to free memory
-            tcod.path_delete(my_path)
+        step = pathing.flow_step(self, target)
+
+        # Every tile closer to the target is taken, wait for one to free up
+        if step:
+            x, y = step
+            pathing.move(self.x, self.y, x, y)
+            self.move(x - self.x, y - self.y)
+
+        return True
 
     # Finds distance to target
     def distance_to(self, other):
@@ -121,8 +249,4 @@ class Entity:
 
 # Checks is space to move is a blocking entity
 def get_blocking_entities_at_location(entities, destination_x, destination_y):
-    for entity in entities:
-        if entity.blocks and entity.x == destination_x and entity.y == destination_y:
-            return entity
-
-    return None
+    return entities.blocking_at(destination_x, destination_y)
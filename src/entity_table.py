@@ -0,0 +1,123 @@
+import numpy as np
+
+from src.components.ai import ConfusedMonster
+from src.death_functions import kill_player, make_corpse
+from src.prototypes import prototype_of, spawn
+
+"""
+    Stores a list of entities as a columnar table per prototype - one array for each field that can differ
+    between entities of the same kind (position, hit points, ...). Everything else comes from the prototype.
+"""
+
+# Columns stored for entities that have each component
+COMPONENT_COLUMNS = (
+    ('fighter', ('hp', 'max_hp', 'defense', 'power', 'xp')),
+    ('level', ('current_level', 'current_xp', 'level_up_base', 'level_up_factor')),
+    ('stairs', ('floor',))
+)
+
+
+# One entity of each prototype, copied for every row of its table (stairs get their floor from the table)
+TEMPLATES = {}
+
+
+# The entity a prototype's rows are copied from, built the first time it is needed
+def template_of(prototype):
+    template = TEMPLATES.get(prototype)
+
+    if template is None:
+        kwargs = {'floor': 0} if prototype in ('stairs_down', 'stairs_up') else {}
+        template = TEMPLATES[prototype] = spawn(prototype, 0, 0, **kwargs)
+
+    return template
+
+
+# Monsters are turned into remains when they die, the player keeps their fighter
+def is_dead(entity):
+    return entity.name.startswith('remains of ') or bool(entity.fighter and entity.fighter.hp <= 0)
+
+
+# Encodes entities as arrays named '<table>/<prototype>.<column>'
+def encode_entities(entities, table='entities'):
+    groups = {}
+    for index, entity in enumerate(entities):
+        groups.setdefault(prototype_of(entity), []).append((index, entity))
+
+    arrays = {}
+    for prototype, group in groups.items():
+        rows = [entity for index, entity in group]
+
+        # The index keeps the original order, which decides turn order and drawing order
+        columns = {
+            'index': [index for index, entity in group],
+            'x': [entity.x for entity in rows],
+            'y': [entity.y for entity in rows],
+            'dead': [is_dead(entity) for entity in rows]
+        }
+
+        for component_name, names in COMPONENT_COLUMNS:
+            components = [getattr(entity, component_name) for entity in rows]
+
+            if any(components):
+                for name in names:
+                    columns[name] = [getattr(component, name) if component else 0 for component in components]
+
+        if any(entity.ai for entity in rows):
+            columns['confused_turns'] = [entity.ai.number_of_turns if isinstance(entity.ai, ConfusedMonster) else -1
+                                         for entity in rows]
+
+        for name, values in columns.items():
+            arrays['{0}/{1}.{2}'.format(table, prototype, name)] = np.array(values, dtype=np.int32)
+
+    return arrays
+
+
+# Rebuilds the entities of one table from their prototypes, in their original order
+def decode_entities(arrays, table='entities'):
+    prefix = table + '/'
+    tables = {}
+
+    for name, array in arrays.items():
+        if name.startswith(prefix):
+            prototype, column = name[len(prefix):].rsplit('.', 1)
+            tables.setdefault(prototype, {})[column] = array.tolist()
+
+    rows = []
+    for prototype, columns in tables.items():
+        confused_turns = columns.get('confused_turns')
+
+        # Every row is a copy of the prototype's template with its own columns set, which is much cheaper
+        # than building each entity from the prototype
+        template = template_of(prototype)
+
+        component_columns = [(component_name, [(name, columns[name]) for name in names if name in columns])
+                             for component_name, names in COMPONENT_COLUMNS if getattr(template, component_name)]
+
+        xs = columns['x']
+        ys = columns['y']
+
+        for i, index in enumerate(columns['index']):
+            entity = template.copy_at(xs[i], ys[i])
+
+            for component_name, component_values in component_columns:
+                component = getattr(entity, component_name)
+
+                for name, values in component_values:
+                    setattr(component, name, values[i])
+
+            if entity.ai and confused_turns and confused_turns[i] >= 0:
+                confused_ai = ConfusedMonster(entity.ai, confused_turns[i])
+                confused_ai.owner = entity
+                entity.ai = confused_ai
+
+            if columns['dead'][i]:
+                if prototype == 'player':
+                    kill_player(entity)
+                else:
+                    make_corpse(entity)
+
+            rows.append((index, entity))
+
+    rows.sort(key=lambda row: row[0])
+
+    return [entity for index, entity in rows]
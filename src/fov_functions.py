@@ -5,16 +5,15 @@ import tcod
 """
 
 
-# Initializes field of view for the given map
+# Returns the field of view map for the given floor, creating it on first use
+# The game map keeps it up to date as tiles change, so this is only a bulk copy once per floor
 def initialize_fov(game_map):
-    fov_map = tcod.map_new(game_map.width, game_map.height)
+    if game_map.fov_map is None:
+        # Ordered [x, y] so the layers copy straight across from the game map
+        game_map.fov_map = tcod.map.Map(game_map.width, game_map.height, order='F')
+        game_map.sync_fov(slice(None), slice(None))
 
-    for y in range(game_map.height):
-        for x in range(game_map.width):
-            tcod.map_set_properties(fov_map, x, y, not game_map.tiles[x][y].block_sight,
-                                    not game_map.tiles[x][y].blocked)
-
-    return fov_map
+    return game_map.fov_map
 
 
 # Recomputes the field of view when player moves (note the defaults)
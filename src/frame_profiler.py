@@ -0,0 +1,134 @@
+import csv
+import os
+from collections import deque
+
+import numpy as np
+import tcod
+
+"""
+    Frame time profiler - times the phases of every frame (field of view, the map, entity and panel passes
+    of render_all, console_flush and the enemy phase) and keeps a rolling window of them.
+    The overlay (F3) shows min / average / 99th percentile for each phase over the frames it ran in, with a
+    sparkline of the recent frames, and F4 writes every frame in the window to a CSV file.
+"""
+
+PHASES = ('fov', 'map', 'entities', 'panel', 'flush', 'enemies')
+
+# Frames kept for the statistics and the CSV file
+HISTORY = 1000
+
+# Frames shown in the sparklines
+SPARKLINE_LENGTH = 30
+
+PROFILE_PATH = 'sav/frame_profile.csv'
+
+# Sparkline cells, from a phase that didn't run up to the slowest frame shown
+SPARK_CHARS = (ord(' '), tcod.CHAR_BLOCK1, tcod.CHAR_BLOCK2, tcod.CHAR_BLOCK3)
+
+# Column the sparklines start at, after the statistics
+SPARKLINE_X = 33
+
+# A frame at 60 fps, sparkline cells of phases taking over half of it are drawn in red
+FRAME_BUDGET = 1 / 60
+
+
+class FrameProfiler:
+    def __init__(self, history=HISTORY):
+        # Phase timings of each finished frame, in seconds, in the order of PHASES (None for phases that didn't run)
+        self.frames = deque(maxlen=history)
+        # Phase timings of the frame in progress, only the phases that ran so far
+        self.current = {}
+        # Frames finished since the profiler was made, for the frame numbers in the CSV file
+        self.frame_count = 0
+
+        self.visible = False
+        # Where the last CSV file was written, shown in the overlay
+        self.last_dump = None
+
+    # Adds time spent in a phase to the frame in progress
+    def add(self, phase, seconds):
+        self.current[phase] = self.current.get(phase, 0.0) + seconds
+
+    # Finishes the frame in progress
+    def end_frame(self):
+        self.frames.append(tuple(self.current.get(phase) for phase in PHASES))
+        self.current = {}
+        self.frame_count += 1
+
+    # Phase timings of the window as an array in milliseconds, NaN where a phase didn't run
+    def timings(self):
+        return np.array(self.frames, dtype=float).reshape(-1, len(PHASES)) * 1000
+
+    # Min, average and 99th percentile of each phase over the frames in the window it ran in, in milliseconds,
+    # and the number of those frames - an idle redraw doesn't pull a phase's minimum and average down to 0
+    def statistics(self):
+        timings = self.timings()
+        statistics = {}
+
+        for i, phase in enumerate(PHASES):
+            ran = timings[:, i][~np.isnan(timings[:, i])]
+
+            if ran.size:
+                statistics[phase] = (ran.min(), ran.mean(), np.percentile(ran, 99), ran.size)
+            else:
+                statistics[phase] = (0.0, 0.0, 0.0, 0)
+
+        return statistics
+
+    # Writes every frame in the window to a CSV file, one row per frame with each phase in milliseconds
+    # Phases that didn't run in a frame are left empty
+    def dump(self, path=PROFILE_PATH):
+        first_frame = self.frame_count - len(self.frames)
+
+        with open(path, 'w', newline='') as profile_file:
+            writer = csv.writer(profile_file)
+            writer.writerow(('frame',) + tuple('{0}_ms'.format(phase) for phase in PHASES) + ('total_ms',))
+
+            for number, timings in enumerate(self.frames, first_frame):
+                ran = [seconds for seconds in timings if seconds is not None]
+                writer.writerow([number] + ['' if seconds is None else '{0:.4f}'.format(seconds * 1000)
+                                            for seconds in timings] + ['{0:.4f}'.format(sum(ran) * 1000)])
+
+        self.last_dump = os.path.abspath(path)
+
+
+# Draws the profiler's overlay in the top right corner of the root console
+def draw_profiler(profiler, screen_width):
+    width = SPARKLINE_X + SPARKLINE_LENGTH
+    height = len(PHASES) + 3
+    window = tcod.console_new(width, height)
+
+    tcod.console_set_default_foreground(window, tcod.white)
+    # Each phase's statistics are over the frames it ran in, out of all the frames in the window
+    tcod.console_print_ex(window, 0, 0, tcod.BKGND_NONE, tcod.LEFT,
+                          '{0:<8} {1:>5} {2:>5} {3:>5} {4:>5}  of {5} frames, ms'.format(
+                              'phase', 'min', 'avg', 'p99', 'ran', len(profiler.frames)))
+
+    # Phases that didn't run are 0 in the sparklines, drawn as blank cells
+    recent = np.nan_to_num(profiler.timings()[-SPARKLINE_LENGTH:] / 1000)
+    statistics = profiler.statistics()
+
+    for row, phase in enumerate(PHASES):
+        y = row + 1
+        minimum, average, p99, ran = statistics[phase]
+
+        tcod.console_set_default_foreground(window, tcod.light_gray)
+        tcod.console_print_ex(window, 0, y, tcod.BKGND_NONE, tcod.LEFT,
+                              '{0:<8} {1:5.1f} {2:5.1f} {3:5.1f} {4:5}'.format(phase, minimum, average, p99, ran))
+
+        # One cell per frame, shaded by the phase's time against its slowest frame shown
+        timings = recent[:, row]
+        slowest = timings.max(initial=0)
+
+        for i, seconds in enumerate(timings):
+            level = 1 + min(int(seconds / slowest * 3), 2) if seconds > 0 else 0
+            color = tcod.red if seconds > FRAME_BUDGET / 2 else tcod.light_green
+            tcod.console_put_char_ex(window, SPARKLINE_X + i, y, SPARK_CHARS[level], color, tcod.black)
+
+    tcod.console_set_default_foreground(window, tcod.gray)
+    footer = 'F3 hide  F4 save CSV'
+    if profiler.last_dump:
+        footer += '  saved {0}'.format(profiler.last_dump)
+    tcod.console_print_ex(window, 0, height - 1, tcod.BKGND_NONE, tcod.LEFT, footer[:width])
+
+    tcod.console_blit(window, 0, 0, width, height, 0, screen_width - width, 0, 1.0, 0.8)
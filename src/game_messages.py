@@ -1,12 +1,16 @@
 import tcod
 import textwrap
 
+from src.slotted import Slotted
+
 """
     Handles the messaging log that appears at the bottom of the screen.
 """
 
 
-class Message:
+class Message(Slotted):
+    __slots__ = ('text', 'color')
+
     def __init__(self, text, color=tcod.white):
         self.text = text
         self.color = color
@@ -8,6 +8,25 @@ from src.game_states import GameStates
 """
 
 
+# Sleeps until the next key press or mouse event and reads it into key and mouse
+# Nothing on screen changes by itself, so the loops have no reason to wake up before then
+def wait_for_input(key, mouse):
+    tcod.sys_wait_for_event(tcod.EVENT_KEY_PRESS | tcod.EVENT_MOUSE, key, mouse, False)
+
+
+# Debug keys, available in every game state - F3 shows or hides the frame profiler, F4 saves its samples,
+# F5 starts tracing turns or stops and saves the trace
+def handle_debug_keys(key):
+    if key.vk == tcod.KEY_F3:
+        return {'toggle_profiler': True}
+    elif key.vk == tcod.KEY_F4:
+        return {'dump_profile': True}
+    elif key.vk == tcod.KEY_F5:
+        return {'toggle_trace': True}
+
+    return {}
+
+
 # Returns functions of keys based on GameState
 def handle_keys(key, game_state):
     if game_state == GameStates.PLAYERS_TURN:
@@ -137,11 +156,14 @@ def handle_player_turn_keys(key):
     elif key.vk == tcod.KEY_ENTER and key.lalt:
         return {'fullscreen': True}
 
-    # TODO Make player go back upstairs
     # Goes down stairs
     elif key.vk == tcod.KEY_ENTER or key.shift and key_char == '.':   # > key doesn't work, hack to make it work.
         return {'take_stairs_down': True}
 
+    # Goes back up stairs
+    elif key.shift and key_char == ',':   # Same hack for the < key
+        return {'take_stairs_up': True}
+
     # Access character screen
     elif key_char == 'c':
         return {'show_character_screen': True}
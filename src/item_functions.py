@@ -1,7 +1,9 @@
 import tcod
 
+from src.component_store import FIGHTER
 from src.components.ai import ConfusedMonster
 from src.game_messages import Message
+from src.turn_results import ItemConsumed, LogMessage
 
 """
     Defines how each item is 'used' in the game
@@ -20,10 +22,11 @@ def heal(*args, **kwargs):
     results = []
 
     if entity.fighter.hp == entity.fighter.max_hp:
-        results.append({'consumed': False, 'message': Message('You are already at full health.', tcod.yellow)})
+        results.append(LogMessage(Message('You are already at full health.', tcod.yellow)))
     else:
         entity.fighter.heal(amount)
-        results.append({'consumed': True, 'message': Message('Your wounds are starting to heal!', tcod.green)})
+        results.append(LogMessage(Message('Your wounds are starting to heal!', tcod.green)))
+        results.append(ItemConsumed())
 
     return results
 
@@ -38,25 +41,19 @@ def cast_lightning(*args, **kwargs):
 
     results = []
 
-    target = None
-    closest_distance = maximum_range + 1
-
-    for entity in entities:
-        if entity.fighter and entity != caster and tcod.map_is_in_fov(fov_map, entity.x, entity.y):
-            distance = caster.distance_to(entity)
-
-            if distance < closest_distance:
-                target = entity
-                closest_distance = distance
+    # The nearest fighter in view - the bolt has always reached anything less than one tile past the range
+    targets = entities.nearest(caster.x, caster.y, max_distance=maximum_range + 1, components=FIGHTER, fov_map=fov_map,
+                               exclude=caster)
+    target = targets[0] if targets else None
 
     if target:
-        results.append({'consumed': True, 'target': target, 'message': Message(
+        results.append(LogMessage(Message(
             'A lightning bolt strikes the {0} with a thunderous boom! {1} takes {2} damage.'.format(
-                target.name, target.name, damage), tcod.dark_yellow)})
+                target.name, target.name, damage), tcod.dark_yellow)))
+        results.append(ItemConsumed())
         results.extend(target.fighter.take_damage(damage))
     else:
-        results.append({'consumed': False, 'target': None, 'message': Message(
-            'No enemy is close enough to strike.', tcod.red)})
+        results.append(LogMessage(Message('No enemy is close enough to strike.', tcod.red)))
 
     return results
 
@@ -73,18 +70,21 @@ def cast_fireball(*args, **kwargs):
     results = []
 
     if not tcod.map_is_in_fov(fov_map, target_x, target_y):
-        results.append({'consumed': False, 'message': Message('You cannot target something outside your field of view',
-                                                              tcod.yellow)})
+        results.append(LogMessage(Message('You cannot target something outside your field of view', tcod.yellow)))
         return results
 
-    results.append({'consumed': True, 'message': Message('The fireball explodes, burning everything within {0} tiles.'.
-                                                         format(radius), tcod.orange)})
+    results.append(LogMessage(Message('The fireball explodes, burning everything within {0} tiles.'.format(radius),
+                                      tcod.orange)))
+    results.append(ItemConsumed())
+
+    # Every burn is reported before the deaths, so the engine applies the deaths together
+    deaths = []
+    for entity in entities.within(target_x, target_y, radius, FIGHTER):
+        results.append(LogMessage(Message('The {0} gets burned for {1} hit points.'.format(entity.name, damage),
+                                          tcod.orange)))
+        deaths.extend(entity.fighter.take_damage(damage))
 
-    for entity in entities:
-        if entity.distance(target_x, target_y) <= radius and entity.fighter:
-            results.append({'message': Message('The {0} gets burned for {1} hit points.'.format(entity.name, damage),
-                            tcod.orange)})
-            results.extend(entity.fighter.take_damage(damage))
+    results.extend(deaths)
 
     return results
 
@@ -100,23 +100,21 @@ def cast_confuse(*args, **kwargs):
     results = []
 
     if not tcod.map_is_in_fov(fov_map, target_x, target_y):
-        results.append({'consumed': False, 'message': Message('You cannot target something outside your field of view.',
-                                                              tcod.yellow)})
+        results.append(LogMessage(Message('You cannot target something outside your field of view.', tcod.yellow)))
         return results
 
-    for entity in entities:
-        if entity.x == target_x and entity.y == target_y and entity.ai:
+    for entity in entities.at(target_x, target_y):
+        if entity.ai:
             confused_ai = ConfusedMonster(entity.ai, 10)
 
             confused_ai.owner = entity
             entity.ai = confused_ai
 
-            results.append({'consumed': True, 'message': Message('The eyes of the {0} glaze over, as it starts to '
-                                                                 'stumble around'.format(entity.name),
-                                                                 tcod.light_green)})
+            results.append(LogMessage(Message('The eyes of the {0} glaze over, as it starts to stumble around'.format(
+                entity.name), tcod.light_green)))
+            results.append(ItemConsumed())
 
             break
     else:
-        results.append({'consumed': False, 'message': Message('There is no targetable enemy at that location.',
-                                                              tcod.yellow)})
+        results.append(LogMessage(Message('There is no targetable enemy at that location.', tcod.yellow)))
     return results
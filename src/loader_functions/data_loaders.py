@@ -1,33 +1,188 @@
 import os
 import shelve
+import struct
+import uuid
+
+import numpy as np
+import tcod
+
+from src.entity_table import decode_entities, encode_entities
+from src.game_messages import Message, MessageLog
+from src.game_states import GameStates
+from src.loader_functions.initialize_new_game import get_game_constants
+from src.loader_functions.journal import JOURNAL_PATH, journal_path_for, read_journal, replay
+from src.loader_functions.packing import pack_arrays, unpack_arrays
+from src.map_objects.floor_store import FloorStore, floor_arrays, floor_from_arrays
+from src.map_objects.game_map import GameMap
+from src.random_utils import GameRandom
+from src.spatial_index import EntityList
+from src.turn_engine import TurnEngine
 
 """
     Handles the saving and loading of game
+    Saves are one binary file - a magic number and format version, then the packed arrays (see packing.py):
+    the tile layers as bit arrays, the explored mask run-length encoded, the entities as columnar tables
+    per prototype, and every stored floor.
+    Games saved with shelve by older versions are converted the first time they are loaded.
+    Each save is also the snapshot the crash recovery journal (see journal.py) builds on.
 """
 
+SAVE_PATH = 'sav/savegame.yarg'
+# A new game's snapshots go here until it is saved, so starting one doesn't replace the save
+NEW_GAME_PATH = 'sav/newgame.yarg'
+LEGACY_SAVE_PATH = 'sav/savegame'
+
+SAVE_MAGIC = b'YARG'
+# 1 - first binary format
+# 2 - explored mask run-length encoded (version 1 saves still load)
+SAVE_VERSION = 2
+
+# Random streams saved with the game
+RANDOM_STREAMS = ('map', 'spawn', 'ai')
+
+
+# Saves game to savegame.yarg, returning the id of the snapshot for the journal
+def save_game(player, entities, game_map, message_log, game_state, path=SAVE_PATH):
+    snapshot_id = uuid.uuid4().hex
+
+    arrays = floor_arrays(game_map, entities)
+    arrays.update(encode_entities(player.inventory.items, 'inventory'))
+
+    streams = {}
+    for name in RANDOM_STREAMS:
+        version, internal_state, gauss_next = getattr(game_map.rng, name).getstate()
+        arrays['rng/' + name] = np.array(internal_state, dtype=np.uint32)
+        streams[name] = [version, gauss_next]
+
+    floor_levels = []
+    for dungeon_level, record in game_map.floors.records():
+        arrays['floors/{0}'.format(dungeon_level)] = np.frombuffer(record, dtype=np.uint8)
+        floor_levels.append(dungeon_level)
+
+    meta = {
+        'snapshot': snapshot_id,
+        'player_index': entities.index(player),
+        'game_state': game_state.name,
+        'map': {'width': game_map.width, 'height': game_map.height, 'dungeon_level': game_map.dungeon_level},
+        'rng': {'seed': game_map.rng.seed, 'streams': streams},
+        'floors': {'memory_budget': game_map.floors.memory_budget, 'directory': game_map.floors.directory,
+                   'levels': floor_levels},
+        'messages': {'x': message_log.x, 'width': message_log.width, 'height': message_log.height,
+                     'lines': [[message.text, list(message.color)] for message in message_log.messages]}
+    }
 
-# Saves game to savegame.dat
-def save_game(player, entities, game_map, message_log, game_state):
-    with shelve.open('sav/savegame', 'n') as data_file:
-        data_file['player_index'] = entities.index(player)
-        data_file['entities'] = entities
-        data_file['game_map'] = game_map
-        data_file['message_log'] = message_log
-        data_file['game_state'] = game_state
+    # Written next to the old save first, so a failed save never leaves a broken file behind
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as save_file:
+        save_file.write(SAVE_MAGIC)
+        save_file.write(struct.pack('<H', SAVE_VERSION))
+        save_file.write(pack_arrays(arrays, meta))
 
+    os.replace(temporary_path, path)
+
+    return snapshot_id
+
+
+# Loads game from savegame.yarg if present, converting an older shelve save otherwise
+# Actions journaled after the save (the game didn't exit cleanly) are replayed on top of it
+def load_game(path=SAVE_PATH, legacy_path=LEGACY_SAVE_PATH, journal_path=JOURNAL_PATH):
+    if not os.path.isfile(path):
+        if os.path.isfile(legacy_path + '.dat'):
+            return migrate_legacy_game(legacy_path, path)
 
-# Loads game from savegame.dat if present
-def load_game():
-    if not os.path.isfile('sav/savegame.dat'):
         raise FileNotFoundError
 
-    with shelve.open('sav/savegame', 'r') as data_file:
+    with open(path, 'rb') as save_file:
+        data = save_file.read()
+
+    if data[:len(SAVE_MAGIC)] != SAVE_MAGIC:
+        raise ValueError('{0} is not a saved game'.format(path))
+
+    (version,) = struct.unpack_from('<H', data, len(SAVE_MAGIC))
+    if version > SAVE_VERSION:
+        raise ValueError('{0} was saved in format version {1}, this game reads up to version {2}'.format(
+            path, version, SAVE_VERSION))
+
+    arrays, meta = unpack_arrays(data[len(SAVE_MAGIC) + 2:])
+
+    rng = GameRandom(meta['rng']['seed'])
+    for name, (stream_version, gauss_next) in meta['rng']['streams'].items():
+        getattr(rng, name).setstate((stream_version, tuple(arrays['rng/' + name].tolist()), gauss_next))
+
+    floors = FloorStore(meta['floors']['memory_budget'], meta['floors']['directory'])
+    for dungeon_level in meta['floors']['levels']:
+        floors.in_memory[dungeon_level] = arrays['floors/{0}'.format(dungeon_level)].tobytes()
+    floors.evict()
+
+    map_meta = meta['map']
+    game_map = GameMap(map_meta['width'], map_meta['height'], map_meta['dungeon_level'], rng, floors)
+    layers, floor_entities = floor_from_arrays(arrays, map_meta['width'], map_meta['height'])
+
+    for name, layer in layers.items():
+        setattr(game_map, name, layer)
+
+    entities = EntityList(floor_entities)
+    player = entities[meta['player_index']]
+    player.inventory.items = decode_entities(arrays, 'inventory')
+
+    message_meta = meta['messages']
+    message_log = MessageLog(message_meta['x'], message_meta['width'], message_meta['height'])
+    message_log.messages = [Message(text, tcod.Color(*color)) for text, color in message_meta['lines']]
+
+    game_state = GameStates[meta['game_state']]
+
+    # Saves written before the journal have no snapshot id, and nothing to replay on top
+    entries = read_journal(meta['snapshot'], journal_path) if 'snapshot' in meta else []
+
+    if entries:
+        constants = get_game_constants()
+        constants['pregenerate_floors'] = False
+
+        engine = TurnEngine(player, entities, game_map, message_log, game_state, constants)
+        replayed, matched = replay(engine, entries)
+
+        if matched:
+            message_log.add_message(Message('Recovered {0} actions after the game closed unexpectedly.'.format(
+                replayed), tcod.yellow))
+        else:
+            message_log.add_message(Message('Recovered {0} of {1} actions after the game closed unexpectedly, '
+                                            'the game may differ from when it closed.'.format(replayed, len(entries)),
+                                            tcod.yellow))
+
+        entities = engine.entities
+        game_state = engine.game_state
+
+    return player, entities, game_map, message_log, game_state
+
+
+# Removes a save and its journal
+def delete_save(path):
+    for file_path in (path, journal_path_for(path)):
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+
+
+# Loads a game saved with shelve by older versions
+def load_legacy_game(path=LEGACY_SAVE_PATH):
+    with shelve.open(path, 'r') as data_file:
         player_index = data_file['player_index']
         entities = data_file['entities']
         game_map = data_file['game_map']
         message_log = data_file['message_log']
         game_state = data_file['game_state']
 
+    # Saves made before the spatial index hold a plain list
+    if not isinstance(entities, EntityList):
+        entities = EntityList(entities)
+
     player = entities[player_index]
 
     return player, entities, game_map, message_log, game_state
+
+
+# Loads a shelve save and writes it back out in the binary format (the old files are left alone)
+def migrate_legacy_game(legacy_path=LEGACY_SAVE_PATH, path=SAVE_PATH):
+    player, entities, game_map, message_log, game_state = load_legacy_game(legacy_path)
+    save_game(player, entities, game_map, message_log, game_state, path)
+
+    return player, entities, game_map, message_log, game_state
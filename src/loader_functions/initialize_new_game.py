@@ -1,13 +1,12 @@
 import tcod
 
-from src.components.fighter import Fighter
-from src.components.inventory import Inventory
-from src.components.level import Level
-from src.entity import Entity
 from src.game_messages import MessageLog
 from src.game_states import GameStates
+from src.map_objects.floor_store import FloorStore
 from src.map_objects.game_map import GameMap
-from src.render_functions import RenderOrder
+from src.prototypes import spawn
+from src.random_utils import GameRandom
+from src.spatial_index import EntityList
 
 """
     Contains game variables and constants.
@@ -31,10 +30,23 @@ def get_game_constants():
     message_width = screen_width - bar_width - 2
     message_height = panel_height - 1
 
-    # Map variables (7 free tiles at bottom for input / messaging)
+    # Viewport onto the map (7 free tiles at bottom for input / messaging)
+    viewport_width = 80
+    viewport_height = 43
+
+    # Map variables - the map can be larger than the viewport, the camera follows the player
     map_width = 80
     map_height = 43
 
+    # Bytes of past floors kept in memory, older floors are moved to disk
+    floor_memory_budget = 4 * 1024 * 1024
+
+    # Generate the next floor down in the background while the player explores
+    pregenerate_floors = True
+
+    # Actions journaled for crash recovery before the next full save
+    snapshot_interval = 100
+
     # Room variables
     room_max_size = 10
     room_min_size = 6
@@ -65,11 +77,16 @@ def get_game_constants():
         'message_x': message_x,
         'message_width': message_width,
         'message_height': message_height,
+        'viewport_width': viewport_width,
+        'viewport_height': viewport_height,
         'map_width': map_width,
         'map_height': map_height,
         'room_max_size': room_max_size,
         'room_min_size': room_min_size,
         'max_rooms': max_rooms,
+        'floor_memory_budget': floor_memory_budget,
+        'pregenerate_floors': pregenerate_floors,
+        'snapshot_interval': snapshot_interval,
         'fov_algorithm': fov_algorithm,
         'fov_light_walls': fov_light_walls,
         'fov_radius': fov_radius,
@@ -79,16 +96,13 @@ def get_game_constants():
     return constants
 
 
-# Game Variables
-def get_game_variables(constants):
-    fighter_component = Fighter(hp=100, defense=1, power=4)
-    inventory_component = Inventory(26)
-    level_component = Level()
-    player = Entity(0, 0, '@', tcod.white, 'Player', blocks=True, render_order=RenderOrder.ACTOR,
-                    fighter=fighter_component, inventory=inventory_component, level=level_component)
-    entities = [player]
+# Game Variables - the seed makes the whole game reproducible, a random one is picked if not given
+def get_game_variables(constants, seed=None):
+    player = spawn('player', 0, 0)
+    entities = EntityList([player])
 
-    game_map = GameMap(constants['map_width'], constants['map_height'])
+    game_map = GameMap(constants['map_width'], constants['map_height'], rng=GameRandom(seed),
+                       floors=FloorStore(constants['floor_memory_budget']))
     game_map.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
                       constants['map_width'], constants['map_height'], player, entities)
 
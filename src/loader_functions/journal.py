@@ -0,0 +1,97 @@
+import json
+import os
+import zlib
+
+import numpy as np
+
+"""
+    Append-only journal of the actions taken since the last full save (the snapshot), for crash recovery.
+    The first line names the snapshot the journal belongs to, then each action is one JSON line
+    together with a check of the game state after it. Loading restores the snapshot and replays the journal.
+"""
+
+JOURNAL_PATH = 'sav/savegame.journal'
+
+
+# The journal kept next to a save
+def journal_path_for(save_path):
+    return os.path.splitext(save_path)[0] + '.journal'
+
+
+# Fingerprint of the game after an action - player position and hit points, and the random streams' state
+def state_check(engine):
+    rng = engine.game_map.rng
+    rng_crc = 0
+
+    for stream in (rng.map, rng.spawn, rng.ai):
+        rng_crc = zlib.crc32(np.array(stream.getstate()[1], dtype=np.uint32).tobytes(), rng_crc)
+
+    return [engine.player.x, engine.player.y, engine.player.fighter.hp, rng_crc]
+
+
+class Journal:
+    def __init__(self, path=JOURNAL_PATH, sync=True):
+        self.path = path
+        # Forces every entry to disk, so even a power cut only loses the action being written
+        self.sync = sync
+
+        # Actions journaled since the snapshot
+        self.length = 0
+        self.file = None
+
+    # Starts an empty journal on top of a new snapshot
+    def begin(self, snapshot_id):
+        self.close()
+        self.file = open(self.path, 'w')
+        self.length = 0
+        self.write({'snapshot': snapshot_id})
+
+    # Appends an action the engine has just run
+    def record(self, action, engine):
+        self.write({'action': action, 'check': state_check(engine)})
+        self.length += 1
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# The entries journaled on top of the given snapshot (none if the journal belongs to another snapshot)
+def read_journal(snapshot_id, path=JOURNAL_PATH):
+    if not os.path.isfile(path):
+        return []
+
+    entries = []
+    with open(path) as journal_file:
+        for line in journal_file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # The last entry was cut off by the crash
+                break
+
+    if not entries or entries[0].get('snapshot') != snapshot_id:
+        return []
+
+    return entries[1:]
+
+
+# Runs journaled actions through the engine again, stopping if the game stops matching the journal
+# Returns the number of actions that matched and whether they all did
+# An action that didn't match has already been run by then, so the game may differ from what the player last saw
+def replay(engine, entries):
+    for count, entry in enumerate(entries, 1):
+        engine.step(entry['action'])
+
+        if state_check(engine) != entry['check']:
+            return count - 1, False
+
+    return len(entries), True
@@ -0,0 +1,42 @@
+import json
+import math
+import struct
+import zlib
+
+import numpy as np
+
+"""
+    Packs named NumPy arrays (plus a little JSON metadata) into one compressed blob and back.
+    Layout before compression: header length (4 bytes), JSON header, then the raw bytes of each array in order.
+"""
+
+
+def pack_arrays(arrays, meta=None):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    header = json.dumps({
+        'meta': meta,
+        'arrays': [[name, array.dtype.str, array.shape] for name, array in arrays.items()]
+    }).encode('utf-8')
+
+    body = [struct.pack('<I', len(header)), header]
+    body.extend(array.tobytes() for array in arrays.values())
+
+    return zlib.compress(b''.join(body))
+
+
+# Returns the arrays (by name) and the metadata
+def unpack_arrays(blob):
+    body = zlib.decompress(blob)
+    (header_length,) = struct.unpack_from('<I', body)
+    header = json.loads(body[4:4 + header_length].decode('utf-8'))
+
+    arrays = {}
+    offset = 4 + header_length
+
+    for name, dtype, shape in header['arrays']:
+        dtype = np.dtype(dtype)
+        count = math.prod(shape)
+        arrays[name] = np.frombuffer(body, dtype, count, offset).reshape(shape)
+        offset += count * dtype.itemsize
+
+    return arrays, header['meta']
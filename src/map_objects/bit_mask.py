@@ -0,0 +1,109 @@
+import numpy as np
+
+from src.map_objects.chunked_grid import axis_range
+
+"""
+    A 2D boolean mask (indexed [x, y] like a NumPy array) packed eight tiles to a byte.
+    Used for the explored layer, which is kept for every floor the player has visited.
+"""
+
+
+class BitMask:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        # Each x holds its column of tiles packed along y, most significant bit first
+        self.bits = np.zeros((width, (height + 7) // 8), dtype=np.uint8)
+
+    @classmethod
+    def from_array(cls, array):
+        mask = cls(array.shape[0], array.shape[1])
+        mask.bits = np.packbits(np.asarray(array, dtype=bool), axis=1)
+        return mask
+
+    @property
+    def shape(self):
+        return self.width, self.height
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __getitem__(self, key):
+        x0, x1, scalar_x = axis_range(key[0], self.width)
+        y0, y1, scalar_y = axis_range(key[1], self.height)
+
+        # Single tile
+        if scalar_x and scalar_y:
+            return bool(self.bits[x0, y0 >> 3] & (0x80 >> (y0 & 7)))
+
+        # Unpacks only the bytes covering the region
+        first_byte = y0 >> 3
+        block = np.unpackbits(self.bits[x0:x1, first_byte:(y1 + 7) >> 3], axis=1)
+        region = block[:, y0 - first_byte * 8:y1 - first_byte * 8].astype(bool)
+
+        if scalar_x:
+            return region[0, :]
+        elif scalar_y:
+            return region[:, 0]
+
+        return region
+
+    def __setitem__(self, key, value):
+        x0, x1, scalar_x = axis_range(key[0], self.width)
+        y0, y1, scalar_y = axis_range(key[1], self.height)
+
+        # Single tile
+        if scalar_x and scalar_y:
+            bit = 0x80 >> (y0 & 7)
+
+            if value:
+                self.bits[x0, y0 >> 3] |= bit
+            else:
+                self.bits[x0, y0 >> 3] &= 0xFF ^ bit
+
+            return
+
+        # Broadcasts the value the way NumPy would, then views it as a 2D region
+        squeezed_shape = tuple(length for length, scalar in ((x1 - x0, scalar_x), (y1 - y0, scalar_y)) if not scalar)
+        value = np.broadcast_to(np.asarray(value, dtype=bool), squeezed_shape).reshape((x1 - x0, y1 - y0))
+
+        # Unpacks the bytes covering the region, writes the region and packs them back
+        first_byte = y0 >> 3
+        last_byte = (y1 + 7) >> 3
+        block = np.unpackbits(self.bits[x0:x1, first_byte:last_byte], axis=1)
+        block[:, y0 - first_byte * 8:y1 - first_byte * 8] = value
+        self.bits[x0:x1, first_byte:last_byte] = np.packbits(block, axis=1)
+
+    # The whole mask as one boolean array
+    def to_array(self):
+        return np.unpackbits(self.bits, axis=1, count=self.height).astype(bool)
+
+    def __array__(self, dtype=None):
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+    def __invert__(self):
+        return ~self.to_array()
+
+
+# Run-length encodes a boolean array (flattened) as the lengths of alternating runs of False and True
+# The first run is always False, so it has a length of 0 when the array starts with True
+def encode_runs(array):
+    flat = np.asarray(array, dtype=bool).ravel()
+
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    run_lengths = np.diff(np.concatenate(([0], changes, [flat.size])))
+
+    if flat.size and flat[0]:
+        run_lengths = np.concatenate(([0], run_lengths))
+
+    # Runs are mostly short, so they are stored as small as they fit
+    return run_lengths.astype(np.uint16 if run_lengths.max(initial=0) < 2 ** 16 else np.uint32)
+
+
+# Rebuilds the boolean array from its runs
+def decode_runs(run_lengths, shape):
+    values = np.arange(len(run_lengths)) % 2 == 1
+    return np.repeat(values, run_lengths).reshape(shape)
@@ -0,0 +1,135 @@
+import numpy as np
+
+"""
+    A 2D grid (indexed [x, y] like a NumPy array) stored as square chunks that are only allocated once
+    something in them differs from the fill value. Untouched rock on a large map costs no memory.
+"""
+
+CHUNK_SIZE = 64
+
+
+# Resolves one axis of an index (an int or a contiguous slice) to (start, stop, is_scalar)
+def axis_range(key, size):
+    if isinstance(key, slice):
+        start, stop, step = key.indices(size)
+
+        if step != 1:
+            raise IndexError('only contiguous slices are supported')
+
+        return start, max(start, stop), False
+
+    key = int(key)
+    if key < 0:
+        key += size
+
+    if not 0 <= key < size:
+        raise IndexError('index {0} is out of bounds for size {1}'.format(key, size))
+
+    return key, key + 1, True
+
+
+class ChunkedGrid:
+    def __init__(self, width, height, fill, dtype=bool, chunk_size=CHUNK_SIZE):
+        self.width = width
+        self.height = height
+        self.fill = fill
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+
+        # (chunk x, chunk y) -> chunk_size x chunk_size array
+        self.chunks = {}
+
+    @classmethod
+    def from_array(cls, array, fill, chunk_size=CHUNK_SIZE):
+        grid = cls(array.shape[0], array.shape[1], fill, array.dtype.type, chunk_size)
+        grid[:, :] = array
+        return grid
+
+    @property
+    def shape(self):
+        return self.width, self.height
+
+    # Bytes used by the allocated chunks
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    # Chunks overlapping the region, with the part of the region each one covers
+    def _overlapping(self, x0, x1, y0, y1):
+        size = self.chunk_size
+
+        for cx in range(x0 // size, (x1 - 1) // size + 1 if x1 > x0 else x0 // size):
+            for cy in range(y0 // size, (y1 - 1) // size + 1 if y1 > y0 else y0 // size):
+                ax0 = max(x0, cx * size)
+                ax1 = min(x1, (cx + 1) * size)
+                ay0 = max(y0, cy * size)
+                ay1 = min(y1, (cy + 1) * size)
+
+                yield (cx, cy), ax0, ax1, ay0, ay1
+
+    def __getitem__(self, key):
+        x0, x1, scalar_x = axis_range(key[0], self.width)
+        y0, y1, scalar_y = axis_range(key[1], self.height)
+        size = self.chunk_size
+
+        # Single tile
+        if scalar_x and scalar_y:
+            chunk = self.chunks.get((x0 // size, y0 // size))
+            return self.fill if chunk is None else chunk[x0 % size, y0 % size]
+
+        region = np.full((x1 - x0, y1 - y0), self.fill, dtype=self.dtype)
+
+        for chunk_key, ax0, ax1, ay0, ay1 in self._overlapping(x0, x1, y0, y1):
+            chunk = self.chunks.get(chunk_key)
+
+            if chunk is not None:
+                cx, cy = chunk_key
+                region[ax0 - x0:ax1 - x0, ay0 - y0:ay1 - y0] = chunk[ax0 - cx * size:ax1 - cx * size,
+                                                                     ay0 - cy * size:ay1 - cy * size]
+
+        if scalar_x:
+            return region[0, :]
+        elif scalar_y:
+            return region[:, 0]
+
+        return region
+
+    def __setitem__(self, key, value):
+        x0, x1, scalar_x = axis_range(key[0], self.width)
+        y0, y1, scalar_y = axis_range(key[1], self.height)
+        size = self.chunk_size
+
+        value = np.asarray(value, dtype=self.dtype)
+        single_value = value.ndim == 0
+
+        # Single values (carving, clearing) are written straight into each chunk,
+        # anything else is broadcast the way NumPy would and viewed as a 2D region
+        if not single_value:
+            squeezed_shape = tuple(length for length, scalar in ((x1 - x0, scalar_x), (y1 - y0, scalar_y))
+                                   if not scalar)
+            value = np.broadcast_to(value, squeezed_shape).reshape((x1 - x0, y1 - y0))
+
+        for chunk_key, ax0, ax1, ay0, ay1 in self._overlapping(x0, x1, y0, y1):
+            part = value if single_value else value[ax0 - x0:ax1 - x0, ay0 - y0:ay1 - y0]
+            chunk = self.chunks.get(chunk_key)
+
+            if chunk is None:
+                # Writing the fill value into an unallocated chunk changes nothing
+                if (part == self.fill).all():
+                    continue
+
+                chunk = self.chunks[chunk_key] = np.full((size, size), self.fill, dtype=self.dtype)
+
+            cx, cy = chunk_key
+            chunk[ax0 - cx * size:ax1 - cx * size, ay0 - cy * size:ay1 - cy * size] = part
+
+    # The whole grid as one array
+    def to_array(self):
+        return self[:, :]
+
+    def __array__(self, dtype=None):
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+    def __invert__(self):
+        return ~self.to_array()
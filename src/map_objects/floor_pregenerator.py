@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.map_objects.game_map import generate_floor
+
+"""
+    Generates the next floor down on a background thread while the player explores the current one,
+    so taking the stairs only has to swap in a finished floor.
+"""
+
+
+class FloorPregenerator:
+    def __init__(self, constants):
+        self.constants = constants
+
+        # Dungeon level -> future of the floor being generated
+        self.pending = {}
+        self.executor = None
+
+    # Starts generating a floor, unless it is already stored or on its way
+    def request(self, game_map, dungeon_level):
+        if dungeon_level in self.pending or dungeon_level in game_map.floors:
+            return
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='floor-pregenerator')
+
+        # The floor's random streams are handed over up front, so the worker never shares state with the game
+        self.pending[dungeon_level] = self.executor.submit(generate_floor, dungeon_level,
+                                                           game_map.rng.floor(dungeon_level), self.constants)
+
+    # The generated floor, waiting for it to finish if needed (None if it was never requested)
+    def take(self, dungeon_level):
+        future = self.pending.pop(dungeon_level, None)
+        return future.result() if future else None
+
+    # Stops the worker, dropping anything still queued
+    # The futures are cancelled one by one, shutdown's cancel_futures needs Python 3.9
+    def close(self):
+        for future in self.pending.values():
+            future.cancel()
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+        self.pending.clear()
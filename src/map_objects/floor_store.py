@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from src.entity_table import decode_entities, encode_entities
+from src.loader_functions.packing import pack_arrays, unpack_arrays
+from src.map_objects.bit_mask import BitMask, decode_runs, encode_runs
+from src.map_objects.chunked_grid import ChunkedGrid
+
+"""
+    Keeps the floors the player has left so they can be revisited.
+    Each floor is packed into one compressed record - the tile layers as bit arrays, the explored mask
+    run-length encoded (explored areas are large connected blobs) and a columnar table of the entities
+    left on it (see entity_table.py). The most recently left floors are kept in memory, the least
+    recently used ones are moved to disk once the records in memory go over the memory budget.
+"""
+
+DEFAULT_MEMORY_BUDGET = 4 * 1024 * 1024
+
+# Tile layers stored one bit per tile, with the value of untouched tiles
+LAYERS = (('blocked', True), ('block_sight', True))
+
+
+# A floor's tile layers, explored mask and entity table, as named arrays
+def floor_arrays(game_map, entities):
+    arrays = {name: np.packbits(np.asarray(getattr(game_map, name), dtype=bool), axis=None) for name, fill in LAYERS}
+    arrays['explored.runs'] = encode_runs(game_map.explored)
+    arrays.update(encode_entities(entities))
+
+    return arrays
+
+
+# Unpacks the arrays made by floor_arrays into the floor's tile layers (by name) and its entities
+def floor_from_arrays(arrays, width, height):
+    layers = {}
+    for name, fill in LAYERS:
+        layer = np.unpackbits(arrays[name], count=width * height).astype(bool).reshape((width, height))
+        layers[name] = ChunkedGrid.from_array(layer, fill)
+
+    # Records and saves from before the run-length encoding hold explored one bit per tile
+    if 'explored.runs' in arrays:
+        explored = decode_runs(arrays['explored.runs'], (width, height))
+    else:
+        explored = np.unpackbits(arrays['explored'], count=width * height).astype(bool).reshape((width, height))
+
+    layers['explored'] = BitMask.from_array(explored)
+
+    return layers, decode_entities(arrays)
+
+
+# Packs a floor and the entities on it (except the player) into one record
+def encode_floor(game_map, entities, player):
+    return pack_arrays(floor_arrays(game_map, [entity for entity in entities if entity is not player]),
+                       {'width': game_map.width, 'height': game_map.height})
+
+
+# Unpacks a record into the floor's tile layers (by name) and its entities
+def decode_floor(record):
+    arrays, meta = unpack_arrays(record)
+    return floor_from_arrays(arrays, meta['width'], meta['height'])
+
+
+class FloorStore:
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, directory=None):
+        # Bytes of records kept in memory before the least recently used ones go to disk
+        self.memory_budget = memory_budget
+        # Where evicted floors are written, a temporary directory is made if not given
+        self.directory = directory
+
+        # Dungeon level -> record, least recently used first
+        self.in_memory = OrderedDict()
+        # Dungeon level -> file holding the evicted record
+        self.on_disk = {}
+
+        self.temporary_directory = None
+
+    def __contains__(self, dungeon_level):
+        return dungeon_level in self.in_memory or dungeon_level in self.on_disk
+
+    # Bytes of the records held in memory
+    @property
+    def memory_used(self):
+        return sum(len(record) for record in self.in_memory.values())
+
+    # Stores the floor the player is leaving
+    def store(self, dungeon_level, game_map, entities, player):
+        self.discard(dungeon_level)
+        self.in_memory[dungeon_level] = encode_floor(game_map, entities, player)
+        self.evict()
+
+    # Takes a floor back out of the store, returning its tile layers (by name) and entities
+    def load(self, dungeon_level):
+        record = self.read(dungeon_level)
+        self.discard(dungeon_level)
+
+        return decode_floor(record)
+
+    # The record of a stored floor, from memory or disk
+    def read(self, dungeon_level):
+        if dungeon_level in self.in_memory:
+            return self.in_memory[dungeon_level]
+
+        with open(self.on_disk[dungeon_level], 'rb') as record_file:
+            return record_file.read()
+
+    # Every stored floor and its record, least recently used first
+    def records(self):
+        for dungeon_level in sorted(self.on_disk):
+            yield dungeon_level, self.read(dungeon_level)
+
+        yield from self.in_memory.items()
+
+    # Forgets a stored floor
+    def discard(self, dungeon_level):
+        self.in_memory.pop(dungeon_level, None)
+        path = self.on_disk.pop(dungeon_level, None)
+
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    # Writes the least recently used records to disk until the rest fit in the memory budget
+    def evict(self):
+        memory_used = self.memory_used
+
+        while self.in_memory and memory_used > self.memory_budget:
+            dungeon_level, record = self.in_memory.popitem(last=False)
+            path = os.path.join(self.get_directory(), 'floor_{0}.bin'.format(dungeon_level))
+
+            with open(path, 'wb') as record_file:
+                record_file.write(record)
+
+            self.on_disk[dungeon_level] = path
+            memory_used -= len(record)
+
+    # Directory for evicted floors - a temporary one is removed again once the store is gone
+    def get_directory(self):
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            return self.directory
+
+        if self.temporary_directory is None:
+            self.temporary_directory = tempfile.mkdtemp(prefix='yarg-floors-')
+            weakref.finalize(self, shutil.rmtree, self.temporary_directory, ignore_errors=True)
+
+        return self.temporary_directory
+
+    # Saved games hold every floor, evicted ones are read back from disk
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['in_memory'] = OrderedDict(self.records())
+        state['on_disk'] = {}
+        state['temporary_directory'] = None
+        return state
+
+    # Loaded floors over the memory budget go back to disk
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.evict()
@@ -1,17 +1,17 @@
+import numpy as np
 import tcod
-from random import randint
 
-from src.components.ai import BasicMonster
-from src.components.fighter import Fighter
-from src.components.item import Item
 from src.entity import Entity
 from src.game_messages import Message
-from src.item_functions import cast_confuse, cast_fireball, cast_lightning, heal
-from src.map_objects.stairs import Stairs
-from src.random_utils import from_dungeon_level, random_choice_from_dict
-from src.render_functions import RenderOrder
-from src.map_objects.tile import Tile
+from src.prototypes import spawn
+from src.random_utils import GameRandom, from_dungeon_level, random_choice_from_dict
+from src.spatial_index import EntityList
+from src.map_objects.tile import TileGrid
+from src.map_objects.bit_mask import BitMask
+from src.map_objects.chunked_grid import ChunkedGrid
+from src.map_objects.floor_store import FloorStore
 from src.map_objects.rectangle import Rectangle
+from src.map_objects.room_index import ROOM_INDEXES
 
 """
     Handles functions related to creating the game map.
@@ -20,21 +20,86 @@ from src.map_objects.rectangle import Rectangle
 
 
 class GameMap:
-    def __init__(self, width, height, dungeon_level=1):
+    def __init__(self, width, height, dungeon_level=1, rng=None, floors=None):
         self.width = width
         self.height = height
-        self.tiles = self.initialize_tiles()
+        self.rng = rng or GameRandom()
+        # Floors the player has left, so they can go back to them
+        self.floors = floors if floors is not None else FloorStore()
+        self.fov_map = None
+        self.initialize_tiles()
         self.dungeon_level = dungeon_level
 
-    # Initializes the dungeon
+    # Initializes the dungeon - tile layers are boolean grids indexed [x, y]
+    # Stored in chunks so only the parts of the map that have been carved out take up memory,
+    # explored is bit-packed since it is kept for every floor visited
     def initialize_tiles(self):
-        tiles = [[Tile(True) for y in range(self.height)] for x in range(self.width)]
-        return tiles
+        self.blocked = ChunkedGrid(self.width, self.height, True)
+        self.block_sight = ChunkedGrid(self.width, self.height, True)
+        self.explored = BitMask(self.width, self.height)
+
+        # The floor's fov map is reused, so it is reset in place rather than rebuilt
+        self.sync_fov(slice(None), slice(None))
+
+    # Copies a region of the tile layers into the floor's fov map (if one has been made yet)
+    def sync_fov(self, x_slice, y_slice):
+        if self.fov_map is not None:
+            self.fov_map.transparent[x_slice, y_slice] = ~self.block_sight[x_slice, y_slice]
+            self.fov_map.walkable[x_slice, y_slice] = ~self.blocked[x_slice, y_slice]
+
+    # Opens up a region of the map, keeping the fov map in step
+    def carve(self, x_slice, y_slice):
+        self.blocked[x_slice, y_slice] = False
+        self.block_sight[x_slice, y_slice] = False
+        self.sync_fov(x_slice, y_slice)
+
+    # Compatibility accessor, game_map.tiles[x][y] reads and writes through to the layers
+    @property
+    def tiles(self):
+        return TileGrid(self)
+
+    # The fov map is not saved, it is copied back from the tile layers on load
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['fov_map'] = None
+        return state
+
+    # Converts saves made before the chunked tile layers (list of lists of Tile objects, or whole arrays)
+    def __setstate__(self, state):
+        tiles = state.pop('tiles', None)
+        state.setdefault('fov_map', None)
+
+        # Saves made before per-game random streams get a fresh set
+        if 'rng' not in state:
+            state['rng'] = GameRandom()
+
+        # Saves made before floors could be revisited have none stored
+        if 'floors' not in state:
+            state['floors'] = FloorStore()
+
+        if tiles is not None:
+            state['blocked'] = np.array([[tile.blocked for tile in column] for column in tiles], dtype=bool)
+            state['block_sight'] = np.array([[tile.block_sight for tile in column] for column in tiles], dtype=bool)
+            state['explored'] = np.array([[tile.explored for tile in column] for column in tiles], dtype=bool)
+
+        for layer, fill in (('blocked', True), ('block_sight', True)):
+            if isinstance(state[layer], np.ndarray):
+                state[layer] = ChunkedGrid.from_array(state[layer], fill)
+
+        if not isinstance(state['explored'], BitMask):
+            state['explored'] = BitMask.from_array(np.asarray(state['explored']))
+
+        self.__dict__.update(state)
 
     # Populates map
-    def make_map(self, max_rooms, room_min_size, room_max_size, map_width, map_height, player, entities):
+    # room_index picks how new rooms are checked for overlaps ('bitmap' by default, 'list' is the original algorithm)
+    def make_map(self, max_rooms, room_min_size, room_max_size, map_width, map_height, player, entities,
+                 room_index='bitmap'):
+        randint = self.rng.map.randint
+
         rooms = []
         num_rooms = 0
+        placed_rooms = ROOM_INDEXES[room_index](map_width, map_height)
 
         center_of_last_room_x = None
         center_of_last_room_y = None
@@ -50,10 +115,7 @@ class GameMap:
 
             # Creates room and checks for intersections
             new_room = Rectangle(x, y, w, h)
-            for other_room in rooms:
-                if new_room.intersect(other_room):
-                    break
-            else:
+            if not placed_rooms.intersects(new_room):
                 # Valid room with no intersections, create room
                 self.create_room(new_room)
 
@@ -64,6 +126,10 @@ class GameMap:
                     # First room, place player here
                     player.x = new_x
                     player.y = new_y
+
+                    # Stairs back up to the floor above, under the player
+                    if self.dungeon_level > 1:
+                        entities.append(spawn('stairs_up', new_x, new_y, floor=self.dungeon_level - 1))
                 else:
                     # All other rooms will connect to previous room with a tunnel
 
@@ -89,32 +155,24 @@ class GameMap:
 
                 # Append the new room to the list
                 rooms.append(new_room)
+                placed_rooms.add(new_room)
                 num_rooms += 1
 
         # Creates stairs to go down to next level
-        stairs_component = Stairs(self.dungeon_level + 1)
-        down_stairs = Entity(center_of_last_room_x, center_of_last_room_y, '>', tcod.white, 'Stairs',
-                             render_order=RenderOrder.STAIRS, stairs=stairs_component)
-        entities.append(down_stairs)
+        entities.append(spawn('stairs_down', center_of_last_room_x, center_of_last_room_y,
+                              floor=self.dungeon_level + 1))
 
     # Creates a room
     def create_room(self, room):
-        for x in range(room.x1 + 1, room.x2):
-            for y in range(room.y1 + 1, room.y2):
-                self.tiles[x][y].blocked = False
-                self.tiles[x][y].block_sight = False
+        self.carve(slice(room.x1 + 1, room.x2), slice(room.y1 + 1, room.y2))
 
     # Creates horizontal tunnel
     def create_h_tunnel(self, x1, x2, y):
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            self.tiles[x][y].blocked = False
-            self.tiles[x][y].block_sight = False
+        self.carve(slice(min(x1, x2), max(x1, x2) + 1), y)
 
     # Creates a vertical tunnel
     def create_v_tunnel(self, y1, y2, x):
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            self.tiles[x][y].blocked = False
-            self.tiles[x][y].block_sight = False
+        self.carve(x, slice(min(y1, y2), max(y1, y2) + 1))
 
     # Places a random number of monsters and items in rooms
     def place_entities(self, room, entities):
@@ -122,6 +180,8 @@ class GameMap:
         max_monsters_per_room = from_dungeon_level([[2, 1], [3, 4], [5, 6]], self.dungeon_level)
         max_items_per_room = from_dungeon_level([[1, 1], [2, 4]], self.dungeon_level)
 
+        randint = self.rng.spawn.randint
+
         number_of_monsters = randint(0, max_monsters_per_room)
         number_of_items = randint(0, max_items_per_room)
 
@@ -146,86 +206,104 @@ class GameMap:
 
             # TODO - add more monsters as you go further down in levels
             # Checks if location to place monster is empty
-            if not any([entity for entity in entities if entity.x == x and entity.y == y]):
+            if not entities.at(x, y):
                 # Used to determine which monster to spawn
-                monster_choice = random_choice_from_dict(monster_chances)
-                # Orc
-                if monster_choice == 'orc':
-                    fighter_component = Fighter(hp=20, defense=0, power=4, xp=35)
-                    ai_component = BasicMonster()
-
-                    monster = Entity(x, y, 'o', tcod.desaturated_green, 'Orc', blocks=True,
-                                     render_order=RenderOrder.ACTOR, fighter=fighter_component, ai=ai_component)
-                # Troll
-                else:
-                    fighter_component = Fighter(hp=30, defense=2, power=8, xp=100)
-                    ai_component = BasicMonster()
-
-                    monster = Entity(x, y, 'T', tcod.darker_green, 'Troll', blocks=True,
-                                     render_order=RenderOrder.ACTOR, fighter=fighter_component, ai=ai_component)
-
-                entities.append(monster)
+                monster_choice = random_choice_from_dict(monster_chances, self.rng.spawn)
+                entities.append(spawn(monster_choice, x, y))
 
         # Spawns items
         for i in range(number_of_items):
             x = randint(room.x1 + 1, room.x2 - 1)
             y = randint(room.y1 + 1, room.y2 - 1)
 
-            if not any([entity for entity in entities if entity.x == x and entity.y == y]):
+            if not entities.at(x, y):
                 # Used to determine what item to spawn
-                item_choice = random_choice_from_dict(item_chances)
-
-                # Healing potion - heals 4 damage
-                if item_choice == 'healing_potion':
-                    item_component = Item(use_function=heal, amount=40)
-                    item = Entity(x, y, '!', tcod.violet, 'Healing Potion', render_order=RenderOrder.ITEM,
-                                  item=item_component)
-
-                # Fireball scroll - deals 12 damage to all enemies in a radius of 3 tiles
-                elif item_choice == 'fireball_scroll':
-                    item_component = Item(use_function=cast_fireball, targeting=True, targeting_message=Message(
-                        'Left-click a target tile for the fireball, or right-click to cancel.', tcod.light_cyan),
-                                          damage=25, radius=3)
-                    item = Entity(x, y, '#', tcod.red, 'Fireball Scroll', render_order=RenderOrder.ITEM,
-                                  item=item_component)
-
-                # Confuse scroll - confuses enemy for 10 turns
-                elif item_choice == 'confusion_scroll':
-                    item_component = Item(use_function=cast_confuse, targeting=True, targeting_message=Message(
-                        'Left-click an enemy to confuse it, or right-click to cancel', tcod.light_cyan))
-                    item = Entity(x, y, '#', tcod.light_pink, 'Confusion Scroll', render_order=RenderOrder.ITEM,
-                                  item=item_component)
-
-                # Lightning scroll - deals 20 damage to nearest enemy
-                else:
-                    item_component = Item(use_function=cast_lightning, damage=40, maximum_range=5)
-                    item = Entity(x, y, '#', tcod.yellow, 'Lightning Scroll', render_order=RenderOrder.ITEM,
-                                  item=item_component)
-
-                entities.append(item)
+                item_choice = random_choice_from_dict(item_chances, self.rng.spawn)
+                entities.append(spawn(item_choice, x, y))
 
     # Checks is tile is able to be walked through
     def is_blocked(self, x, y):
-        if self.tiles[x][y].blocked:
-            return True
+        return bool(self.blocked[x, y])
+
+    # Takes the player to another floor, storing the one they are leaving
+    # A floor visited before is restored as it was left, otherwise a new one is swapped in -
+    # taken from the pregenerator if it has been built ahead of time, or generated there and then
+    # Returns the entities of the floor the player arrives on
+    def change_floor(self, dungeon_level, player, entities, message_log, constants, pregenerator=None):
+        previous_level = self.dungeon_level
+        self.floors.store(previous_level, self, entities, player)
+        self.dungeon_level = dungeon_level
 
-        return False
+        if dungeon_level in self.floors:
+            entities = self.restore_floor(previous_level, player)
+
+            if dungeon_level < previous_level:
+                message_log.add_message(Message('You climb back up the stairs.', tcod.violet))
+            else:
+                message_log.add_message(Message('You head back down the stairs.', tcod.violet))
 
-    # TODO Add in going up a floor
-    # Goes down a floor in the dungeon, creating a new floor
-    def next_floor(self, player, message_log, constants):
-        self.dungeon_level += 1
-        entities = [player]
+            return entities
 
-        # Creates a new map
-        self.tiles = self.initialize_tiles()
-        self.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
-                      constants['map_width'], constants['map_height'], player, entities)
+        floor = pregenerator.take(dungeon_level) if pregenerator else None
 
-        # TODO note when we add stairs back up, we need to make sure that player doesn't gain health again going down
-        # Gives player half of their max hp back
+        if floor is None:
+            floor = generate_floor(dungeon_level, self.rng.floor(dungeon_level), constants)
+
+        entities = self.adopt_floor(floor, player)
+
+        # Gives player half of their max hp back, only the first time they reach a floor
         player.fighter.heal(player.fighter.max_hp // 2)
         message_log.add_message(Message('You take a moment to rest heading down the stairs, restoring some health',
                                         tcod.violet))
 
         return entities
+
+    # Swaps in a floor made by generate_floor, with the player at its start
+    def adopt_floor(self, floor, player):
+        floor_map, floor_entities, (start_x, start_y) = floor
+
+        self.blocked = floor_map.blocked
+        self.block_sight = floor_map.block_sight
+        self.explored = floor_map.explored
+        self.sync_fov(slice(None), slice(None))
+
+        player.x = start_x
+        player.y = start_y
+
+        return EntityList([player] + floor_entities)
+
+    # Puts a stored floor back in place, with the player on the stairs leading to the floor they came from
+    def restore_floor(self, previous_level, player):
+        layers, floor_entities = self.floors.load(self.dungeon_level)
+
+        for name, layer in layers.items():
+            setattr(self, name, layer)
+
+        self.sync_fov(slice(None), slice(None))
+
+        for entity in floor_entities:
+            if entity.stairs and entity.stairs.floor == previous_level:
+                player.x = entity.x
+                player.y = entity.y
+
+                break
+
+        return EntityList([player] + floor_entities)
+
+
+# Generates a floor on a map of its own, without touching the game - so it can run ahead of time on another thread
+# Each floor after the first has its own random streams (GameRandom.floor), which keeps the result
+# the same as generating it when the player arrives
+# Returns the floor's map, its entities and where the player starts
+def generate_floor(dungeon_level, rng, constants):
+    game_map = GameMap(constants['map_width'], constants['map_height'], dungeon_level, rng)
+
+    # Stands in for the player, so nothing spawns where they arrive
+    stand_in = Entity(0, 0, '@', tcod.white, 'Player', blocks=True)
+    entities = EntityList([stand_in])
+
+    game_map.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
+                      constants['map_width'], constants['map_height'], stand_in, entities)
+    entities.remove(stand_in)
+
+    return game_map, list(entities), (stand_in.x, stand_in.y)
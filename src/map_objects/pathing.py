@@ -0,0 +1,111 @@
+import numpy as np
+import tcod
+
+"""
+    Walkability grid shared by every monster during the enemy phase.
+    Built once per phase, then kept up to date as monsters move.
+"""
+
+# Neighbouring tiles a monster can step to
+DIRECTIONS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class PathingGrid:
+    def __init__(self, game_map, entities):
+        self.width = game_map.width
+        self.height = game_map.height
+        self.walkable = ~game_map.blocked
+
+        # Occupancy overlay - tiles that hold a blocking entity
+        self.occupied = np.zeros((game_map.width, game_map.height), dtype=bool)
+
+        for entity in entities:
+            if entity.blocks:
+                self.occupied[entity.x, entity.y] = True
+
+        # Path cost per tile, 1 to walk and 0 for walls or occupied tiles
+        # The A* pathfinder reads this array directly, so edits to it are seen by later queries
+        self.cost = (self.walkable & ~self.occupied).astype(np.int8)
+
+        # The 1.41 is the normal diagonal cost of moving, it can be set to 0.0 if diagonals are prohibited
+        self.astar = tcod.path.AStar(self.cost, 1.41)
+
+        # Distance field (flow field) towards a target, computed on first request
+        self.flow_map = None
+        self.flow_field = None
+        self.flow_origin = None
+
+    # Checks if a tile is a wall or holds a blocking entity
+    def is_blocked(self, x, y):
+        return not self.cost[x, y]
+
+    # Updates the occupancy overlay after a blocking entity moves
+    def move(self, old_x, old_y, new_x, new_y):
+        self.occupied[old_x, old_y] = False
+        self.occupied[new_x, new_y] = True
+        self.refresh(old_x, old_y)
+        self.refresh(new_x, new_y)
+
+    # Recalculates the cost of a single tile from the map and the overlay
+    def refresh(self, x, y):
+        self.cost[x, y] = self.walkable[x, y] and not self.occupied[x, y]
+
+    # Computes an A* path from one entity to another, returning the list of steps (excluding the start)
+    def get_path(self, origin, target):
+        # Start and end points must be free for the path to be found
+        self.cost[origin.x, origin.y] = 1
+        self.cost[target.x, target.y] = 1
+
+        path = self.astar.get_path(origin.x, origin.y, target.x, target.y)
+
+        self.refresh(origin.x, origin.y)
+        self.refresh(target.x, target.y)
+
+        return path
+
+    # Returns the Dijkstra distance field towards the target's tile
+    # Computed once and shared by every monster chasing the same tile this phase
+    # Only walls are taken into account, other monsters are dealt with when stepping
+    def distance_field(self, target):
+        if self.flow_origin != (target.x, target.y):
+            if self.flow_map is None:
+                self.flow_map = tcod.map.Map(self.width, self.height, order='F')
+                self.flow_map.walkable[...] = self.walkable
+                self.flow_field = tcod.dijkstra_new(self.flow_map, 1.41)
+
+            tcod.dijkstra_compute(self.flow_field, target.x, target.y)
+            self.flow_origin = (target.x, target.y)
+
+        return self.flow_field
+
+    # Finds the next step down the distance field towards the target, or None if there isn't a free one
+    def flow_step(self, entity, target):
+        field = self.distance_field(target)
+        current = tcod.dijkstra_get_distance(field, entity.x, entity.y)
+
+        # Negative distance means the target can't be reached from here
+        if current < 0:
+            return None
+
+        best = None
+        best_key = None
+
+        for dx, dy in DIRECTIONS:
+            x = entity.x + dx
+            y = entity.y + dy
+
+            if not (0 <= x < self.width and 0 <= y < self.height) or self.is_blocked(x, y):
+                continue
+
+            distance = tcod.dijkstra_get_distance(field, x, y)
+
+            if 0 <= distance < current:
+                # Ties go to the tile with the fewest occupied neighbours so monsters spread out around the target
+                crowding = np.count_nonzero(self.occupied[max(x - 1, 0):x + 2, max(y - 1, 0):y + 2])
+                key = (distance, crowding)
+
+                if best_key is None or key < best_key:
+                    best = (x, y)
+                    best_key = key
+
+        return best
@@ -1,9 +1,13 @@
+from src.slotted import Slotted
+
 """
 Support for rectangles (for collision purposes mostly)
 """
 
 
-class Rectangle:
+class Rectangle(Slotted):
+    __slots__ = ('x1', 'y1', 'x2', 'y2')
+
     def __init__(self, x, y, w, h):
         self.x1 = x
         self.y1 = y
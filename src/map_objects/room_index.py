@@ -0,0 +1,42 @@
+import numpy as np
+
+"""
+    Keeps track of the rooms placed so far so new rooms can be checked for overlaps
+"""
+
+
+# Checks a new room against every room placed before it (cost grows with the number of rooms)
+class RoomList:
+    def __init__(self, map_width, map_height):
+        self.rooms = []
+
+    def intersects(self, room):
+        for other_room in self.rooms:
+            if room.intersect(other_room):
+                return True
+
+        return False
+
+    def add(self, room):
+        self.rooms.append(room)
+
+
+# Marks every tile covered by a room (walls included) in an occupancy bitmap,
+# so checking a new room only looks at the tiles under it, however many rooms there are
+class RoomBitmap:
+    def __init__(self, map_width, map_height):
+        self.occupied = np.zeros((map_width + 1, map_height + 1), dtype=bool)
+
+    # Same result as Rectangle.intersect against every placed room (edges are inclusive)
+    def intersects(self, room):
+        return bool(self.occupied[room.x1:room.x2 + 1, room.y1:room.y2 + 1].any())
+
+    def add(self, room):
+        self.occupied[room.x1:room.x2 + 1, room.y1:room.y2 + 1] = True
+
+
+# Room index types, by name
+ROOM_INDEXES = {
+    'list': RoomList,
+    'bitmap': RoomBitmap
+}
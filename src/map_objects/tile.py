@@ -1,9 +1,13 @@
+from src.slotted import Slotted
+
 """
 A  tile on a map. It may or may not be blocked, and may or may not block sight.
 """
 
 
-class Tile:
+class Tile(Slotted):
+    __slots__ = ('blocked', 'block_sight', 'explored')
+
     def __init__(self, blocked, block_sight=None):
         self.blocked = blocked
 
@@ -13,3 +17,68 @@ class Tile:
 
         self.block_sight = block_sight
         self.explored = False
+
+
+"""
+    Compatibility accessors so game_map.tiles[x][y].blocked keeps working
+    on top of the array-backed tile layers in GameMap
+"""
+
+
+# A single tile that reads and writes straight through to the map layers
+class TileProxy:
+    __slots__ = ('game_map', 'x', 'y')
+
+    def __init__(self, game_map, x, y):
+        self.game_map = game_map
+        self.x = x
+        self.y = y
+
+    @property
+    def blocked(self):
+        return bool(self.game_map.blocked[self.x, self.y])
+
+    @blocked.setter
+    def blocked(self, value):
+        self.game_map.blocked[self.x, self.y] = value
+
+    @property
+    def block_sight(self):
+        return bool(self.game_map.block_sight[self.x, self.y])
+
+    @block_sight.setter
+    def block_sight(self, value):
+        self.game_map.block_sight[self.x, self.y] = value
+
+    @property
+    def explored(self):
+        return bool(self.game_map.explored[self.x, self.y])
+
+    @explored.setter
+    def explored(self, value):
+        self.game_map.explored[self.x, self.y] = value
+
+
+# One column of the map (tiles[x])
+class TileColumn:
+    def __init__(self, game_map, x):
+        self.game_map = game_map
+        self.x = x
+
+    def __getitem__(self, y):
+        return TileProxy(self.game_map, self.x, y)
+
+    def __len__(self):
+        return self.game_map.height
+
+
+# The whole map (tiles)
+class TileGrid:
+    def __init__(self, game_map):
+        self.game_map = game_map
+
+    def __getitem__(self, x):
+        return TileColumn(self.game_map, x)
+
+    def __len__(self):
+        return self.game_map.width
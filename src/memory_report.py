@@ -0,0 +1,123 @@
+import gc
+import sys
+import tracemalloc
+import types
+from collections import Counter
+
+from src.bot_policies import POLICIES
+from src.game_states import GameStates
+from src.loader_functions.initialize_new_game import get_game_constants, get_game_variables
+from src.turn_engine import TurnEngine
+
+"""
+    Memory report - plays a seeded game headlessly for a number of turns under tracemalloc, then measures
+    what the game state holds on to, broken down by type, as bytes per tile and bytes per entity.
+
+    python -m src.simulate --memory-report --max-turns 500 --seed 3
+"""
+
+# Shared by everything rather than owned by the game state, so not counted
+NOT_OWNED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+# Rows shown in the by-type and by-file tables
+TOP = 15
+
+
+# Count and bytes of every object reachable from the roots, by type name
+# Objects in exclude (and everything only reachable through them) are left out
+def footprint(roots, exclude=()):
+    seen = {id(obj) for obj in exclude}
+    counts = Counter()
+    sizes = Counter()
+
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+
+        if id(obj) in seen or isinstance(obj, NOT_OWNED):
+            continue
+
+        seen.add(id(obj))
+        name = type(obj).__name__
+        counts[name] += 1
+        sizes[name] += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+
+    return counts, sizes
+
+
+# Plays the game and measures it, returning the report as a dict
+def memory_report(seed, policy_name, turns):
+    tracemalloc.start()
+
+    constants = get_game_constants()
+    constants['pregenerate_floors'] = False
+
+    engine = TurnEngine(*get_game_variables(constants, seed), constants)
+    policy = POLICIES[policy_name]()
+
+    while engine.turn < turns and engine.game_state != GameStates.PLAYER_DEAD:
+        action = policy.next_action(engine)
+
+        if action is None:
+            break
+
+        engine.step(action)
+
+    current, peak = tracemalloc.get_traced_memory()
+    by_file = tracemalloc.take_snapshot().statistics('filename')
+    tracemalloc.stop()
+
+    game_map = engine.game_map
+    entities = engine.entities
+
+    # The map's footprint excludes the floors stored away, they are packed records rather than live objects
+    map_counts, map_sizes = footprint([game_map], [game_map.floors])
+    entity_counts, entity_sizes = footprint([entities])
+    message_counts, message_sizes = footprint([engine.message_log])
+
+    counts = map_counts + entity_counts + message_counts
+    sizes = map_sizes + entity_sizes + message_sizes
+
+    return {
+        'seed': seed,
+        'turns': engine.turn,
+        'dungeon_level': game_map.dungeon_level,
+        'tracemalloc': {
+            'current_bytes': current,
+            'peak_bytes': peak,
+            'by_file': [{'file': stat.traceback[0].filename, 'bytes': stat.size, 'blocks': stat.count}
+                        for stat in by_file[:TOP]]
+        },
+        'by_type': [{'type': name, 'count': counts[name], 'bytes': size} for name, size in sizes.most_common()],
+        'tiles': game_map.width * game_map.height,
+        'bytes_per_tile': sum(map_sizes.values()) / (game_map.width * game_map.height),
+        'entities': len(entities),
+        'bytes_per_entity': sum(entity_sizes.values()) / max(len(entities), 1),
+        'messages': len(engine.message_log.messages),
+        'bytes_per_message': sum(message_sizes.values()) / max(len(engine.message_log.messages), 1)
+    }
+
+
+# Prints the report as tables
+def print_report(report):
+    traced = report['tracemalloc']
+    print('Seed {0}, {1} turns, dungeon level {2}'.format(report['seed'], report['turns'], report['dungeon_level']))
+    print('tracemalloc: {0:,} bytes current, {1:,} bytes peak'.format(traced['current_bytes'], traced['peak_bytes']))
+    print()
+
+    print('{0:<30} {1:>10} {2:>14} {3:>10}'.format('type', 'count', 'bytes', 'each'))
+    for row in report['by_type'][:TOP]:
+        print('{0:<30} {1:>10,} {2:>14,} {3:>10.1f}'.format(row['type'], row['count'], row['bytes'],
+                                                             row['bytes'] / row['count']))
+    print()
+
+    print('{0:<10,} tiles      {1:10.2f} bytes per tile'.format(report['tiles'], report['bytes_per_tile']))
+    print('{0:<10,} entities   {1:10.1f} bytes per entity'.format(report['entities'], report['bytes_per_entity']))
+    print('{0:<10,} messages   {1:10.1f} bytes per message'.format(report['messages'],
+                                                                    report['bytes_per_message']))
+    print()
+
+    print('{0:<60} {1:>14} {2:>10}'.format('allocated by file (tracemalloc)', 'bytes', 'blocks'))
+    for row in traced['by_file']:
+        print('{0:<60} {1:>14,} {2:>10,}'.format(row['file'][-60:], row['bytes'], row['blocks']))
@@ -0,0 +1,132 @@
+import tcod
+
+from src.components.ai import BasicMonster
+from src.components.fighter import Fighter
+from src.components.inventory import Inventory
+from src.components.item import Item
+from src.components.level import Level
+from src.entity import Entity
+from src.game_messages import Message
+from src.item_functions import cast_confuse, cast_fireball, cast_lightning, heal
+from src.map_objects.stairs import Stairs
+from src.render_functions import RenderOrder
+
+"""
+    Every kind of entity in the game, by name.
+    Entities are spawned from these, so saves only need to store what has changed since.
+"""
+
+
+def make_player(x, y):
+    fighter_component = Fighter(hp=100, defense=1, power=4)
+    inventory_component = Inventory(26)
+    level_component = Level()
+
+    return Entity(x, y, '@', tcod.white, 'Player', blocks=True, render_order=RenderOrder.ACTOR,
+                  fighter=fighter_component, inventory=inventory_component, level=level_component)
+
+
+def make_orc(x, y):
+    fighter_component = Fighter(hp=20, defense=0, power=4, xp=35)
+    ai_component = BasicMonster()
+
+    return Entity(x, y, 'o', tcod.desaturated_green, 'Orc', blocks=True,
+                  render_order=RenderOrder.ACTOR, fighter=fighter_component, ai=ai_component)
+
+
+def make_troll(x, y):
+    fighter_component = Fighter(hp=30, defense=2, power=8, xp=100)
+    ai_component = BasicMonster()
+
+    return Entity(x, y, 'T', tcod.darker_green, 'Troll', blocks=True,
+                  render_order=RenderOrder.ACTOR, fighter=fighter_component, ai=ai_component)
+
+
+# Healing potion - heals 4 damage
+def make_healing_potion(x, y):
+    item_component = Item(use_function=heal, amount=40)
+
+    return Entity(x, y, '!', tcod.violet, 'Healing Potion', render_order=RenderOrder.ITEM, item=item_component)
+
+
+# Fireball scroll - deals 12 damage to all enemies in a radius of 3 tiles
+def make_fireball_scroll(x, y):
+    item_component = Item(use_function=cast_fireball, targeting=True, targeting_message=Message(
+        'Left-click a target tile for the fireball, or right-click to cancel.', tcod.light_cyan), damage=25, radius=3)
+
+    return Entity(x, y, '#', tcod.red, 'Fireball Scroll', render_order=RenderOrder.ITEM, item=item_component)
+
+
+# Confuse scroll - confuses enemy for 10 turns
+def make_confusion_scroll(x, y):
+    item_component = Item(use_function=cast_confuse, targeting=True, targeting_message=Message(
+        'Left-click an enemy to confuse it, or right-click to cancel', tcod.light_cyan))
+
+    return Entity(x, y, '#', tcod.light_pink, 'Confusion Scroll', render_order=RenderOrder.ITEM,
+                  item=item_component)
+
+
+# Lightning scroll - deals 20 damage to nearest enemy
+def make_lightning_scroll(x, y):
+    item_component = Item(use_function=cast_lightning, damage=40, maximum_range=5)
+
+    return Entity(x, y, '#', tcod.yellow, 'Lightning Scroll', render_order=RenderOrder.ITEM, item=item_component)
+
+
+# Stairs to the floor below
+def make_stairs_down(x, y, floor):
+    return Entity(x, y, '>', tcod.white, 'Stairs', render_order=RenderOrder.STAIRS, stairs=Stairs(floor))
+
+
+# Stairs back to the floor above
+def make_stairs_up(x, y, floor):
+    return Entity(x, y, '<', tcod.white, 'Stairs Up', render_order=RenderOrder.STAIRS, stairs=Stairs(floor))
+
+
+PROTOTYPES = {
+    'player': make_player,
+    'orc': make_orc,
+    'troll': make_troll,
+    'healing_potion': make_healing_potion,
+    'fireball_scroll': make_fireball_scroll,
+    'confusion_scroll': make_confusion_scroll,
+    'lightning_scroll': make_lightning_scroll,
+    'stairs_down': make_stairs_down,
+    'stairs_up': make_stairs_up
+}
+
+# Prototype of entities made before they recorded one, by name
+PROTOTYPE_NAMES = {
+    'Player': 'player',
+    'Orc': 'orc',
+    'Troll': 'troll',
+    'Healing Potion': 'healing_potion',
+    'Fireball Scroll': 'fireball_scroll',
+    'Confusion Scroll': 'confusion_scroll',
+    'Lightning Scroll': 'lightning_scroll',
+    'Stairs': 'stairs_down',
+    'Stairs Up': 'stairs_up'
+}
+
+
+# Builds a new entity of the given kind
+def spawn(prototype, x, y, **kwargs):
+    entity = PROTOTYPES[prototype](x, y, **kwargs)
+    entity.prototype = prototype
+
+    return entity
+
+
+# The kind of an entity, worked out from its name for entities from old saves
+def prototype_of(entity):
+    if entity.prototype:
+        return entity.prototype
+
+    name = entity.name
+    if name.startswith('remains of '):
+        name = name[len('remains of '):]
+
+    if name not in PROTOTYPE_NAMES:
+        raise ValueError('{0} has no prototype'.format(entity.name))
+
+    return PROTOTYPE_NAMES[name]
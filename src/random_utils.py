@@ -1,4 +1,22 @@
-from random import randint
+import random
+
+
+# Per-game random number generator, split into separate streams so that (for example)
+# monster AI rolls never shift how the map is generated
+class GameRandom:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.getrandbits(32)
+
+        self.seed = seed
+        self.map = random.Random('{0}:map'.format(seed))
+        self.spawn = random.Random('{0}:spawn'.format(seed))
+        self.ai = random.Random('{0}:ai'.format(seed))
+
+    # Separate streams for generating one floor, derived from the game seed,
+    # so the floor comes out the same whenever (and on whichever thread) it is generated
+    def floor(self, dungeon_level):
+        return GameRandom('{0}:floor{1}'.format(self.seed, dungeon_level))
 
 
 # Determines when an object should appear in the dungeon and with what 'weight' is has based on dungeon's level
@@ -11,8 +29,8 @@ def from_dungeon_level(table, dungeon_level):
 
 
 # Returns a choice based on 'weight' of an object from a list
-def random_choice_index(chances):
-    random_chance = randint(1, sum(chances))
+def random_choice_index(chances, rng=random):
+    random_chance = rng.randint(1, sum(chances))
 
     running_sum = 0
     choice = 0
@@ -25,8 +43,8 @@ def random_choice_index(chances):
 
 
 # Passes choices to the 'picking' function; assigns choices as key and chances as value
-def random_choice_from_dict(choice_dict):
+def random_choice_from_dict(choice_dict, rng=random):
     choices = list(choice_dict.keys())
     chances = list(choice_dict.values())
 
-    return choices[random_choice_index(chances)]
+    return choices[random_choice_index(chances, rng)]
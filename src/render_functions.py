@@ -1,12 +1,18 @@
+import time
+
 import tcod
 
 from enum import Enum
 
+from src.camera import Camera
 from src.game_states import GameStates
 from src.components.menus import character_screen, inventory_menu, level_up_menu
 
 """
     Rendering (drawing) functions related to drawing things on the screen
+    With a RenderCache, a frame only redraws what changed since the last one - the tiles whose entities
+    moved, appeared or died (tracked by the floor's spatial index), and the panel when what it shows changed.
+    The offscreen consoles keep everything else from frame to frame.
 """
 
 
@@ -17,12 +23,20 @@ class RenderOrder(Enum):
     ACTOR = 4
 
 
+# What the last frame drew, so the next one can leave the rest alone
+class RenderCache:
+    def __init__(self):
+        # Game state the entities were last drawn in, menus and death change what has to be drawn
+        self.game_state = None
+        # What the panel showed (hit points, dungeon level, names under the mouse, messages)
+        self.panel = None
+
+
 # Displays name of mob on mouseover
-def get_names_under_mouse(mouse, entities, fov_map):
-    (x, y) = (mouse.cx, mouse.cy)
+def get_names_under_mouse(mouse, entities, fov_map, camera):
+    (x, y) = camera.to_map(mouse.cx, mouse.cy)
 
-    names = [entity.name for entity in entities
-             if entity.x == x and entity.y == y and tcod.map_is_in_fov(fov_map, entity.x, entity.y)]
+    names = [entity.name for entity in entities.at(x, y) if tcod.map_is_in_fov(fov_map, entity.x, entity.y)]
     names = ', '.join(names)
 
     return names.capitalize()
@@ -44,63 +58,96 @@ def render_bar(panel, x, y, total_width, name, value, maximum, bar_color, back_c
                           '{0}: {1}/{2}'.format(name, value, maximum))
 
 
-# Draws all tiles and entities in game map
+# Draws all tiles and entities in the camera's view of the game map
+# Without a camera the whole map is drawn from the top left of the console
+# Without a cache every entity and the whole panel are drawn again
+# With a profiler the map pass, the entity pass and the panel (with the blits and menus) are timed
 def render_all(con, panel, entities, player, game_map, fov_map, fov_recompute, message_log, screen_width,
-               screen_height, bar_width, panel_height, panel_y, mouse, colors, game_state):
-    if fov_recompute:
-        for y in range(game_map.height):
-            for x in range(game_map.width):
-                visible = tcod.map_is_in_fov(fov_map, x, y)
-                wall = game_map.tiles[x][y].block_sight
-
-                if visible:
-                    if wall:
-                        tcod.console_set_char_background(con, x, y, colors.get('light_wall'), tcod.BKGND_SET)
-                    else:
-                        tcod.console_set_char_background(con, x, y, colors.get('light_ground'), tcod.BKGND_SET)
-
-                    game_map.tiles[x][y].explored = True
-                elif game_map.tiles[x][y].explored:
-                    if wall:
-                        tcod.console_set_char_background(con, x, y, colors.get('dark_wall'), tcod.BKGND_SET)
-                    else:
-                        tcod.console_set_char_background(con, x, y, colors.get('dark_ground'), tcod.BKGND_SET)
-
-    # Draw entities
-    entities_in_render_order = sorted(entities, key=lambda x: x.render_order.value)
-
-    for entity in entities_in_render_order:
-        draw_entity(con, entity, fov_map, game_map)
-
-    # Draws player health
-    tcod.console_set_default_foreground(con, tcod.white)
-    tcod.console_print_ex(con, 1, screen_height - 2, tcod.BKGND_NONE, tcod.LEFT,
-                          'HP: {0:02}/{1:02}'.format(player.fighter.hp, player.fighter.max_hp))
-
-    tcod.console_blit(con, 0, 0, screen_width, screen_height, 0, 0, 0)
-
-    # Draws status panel at bottom
-    tcod.console_set_default_background(panel, tcod.black)
-    tcod.console_clear(panel)
-
-    # Prints game messages, one line at a time
-    y = 1
-    for message in message_log.messages:
-        tcod.console_set_default_foreground(panel, message.color)
-        tcod.console_print_ex(panel, message_log.x, y, tcod.BKGND_NONE, tcod.LEFT, message.text)
-        y += 1
+               screen_height, bar_width, panel_height, panel_y, mouse, colors, game_state, camera=None, cache=None,
+               profiler=None):
+    if camera is None:
+        camera = Camera(game_map.width, game_map.height)
 
-    # Renders the HP bar and current dungeon level
-    render_bar(panel, 1, 1, bar_width, 'HP', player.fighter.hp, player.fighter.max_hp,
-               tcod.light_red, tcod.darker_red)
-    tcod.console_print_ex(panel, 1, 3, tcod.BKGND_NONE, tcod.LEFT, 'Dungeon level: {0}'.format(
-        game_map.dungeon_level))
-
-    # Displays entity name on mouse-over
-    tcod.console_set_default_foreground(panel, tcod.light_gray)
-    tcod.console_print_ex(panel, 1, 0, tcod.BKGND_NONE, tcod.LEFT,
-                          get_names_under_mouse(mouse, entities, fov_map))
+    spatial_index = entities.spatial_index
+    start = time.perf_counter()
 
+    if fov_recompute:
+        # Only the tiles inside the viewport are read from the map layers
+        # Both the fov map and the tile layers are indexed [x, y], the console buffer is [y, x]
+        view = camera.view_slices(game_map)
+        visible = fov_map.fov[view]
+        wall = game_map.block_sight[view]
+        explored = game_map.explored[view]
+        background = con.bg.transpose(1, 0, 2)[:visible.shape[0], :visible.shape[1]]
+
+        # The turn engine has already marked everything in view as explored
+        remembered = explored & ~visible
+
+        # The camera scrolls, so tiles that haven't been seen have to be blanked as well
+        background[~explored] = (0, 0, 0)
+        background[visible & wall] = colors.get('light_wall')
+        background[visible & ~wall] = colors.get('light_ground')
+        background[remembered & wall] = colors.get('dark_wall')
+        background[remembered & ~wall] = colors.get('dark_ground')
+
+    map_done = time.perf_counter()
+
+    # Draw entities - all of them when the view changed, otherwise just the tiles whose entities changed
+    if cache is None or fov_recompute or spatial_index.changed is None or game_state != cache.game_state:
+        view_width, view_height = (view_slice.stop - view_slice.start for view_slice in camera.view_slices(game_map))
+        con.ch[:view_height, :view_width] = ord(' ')
+
+        for entity in entities.in_render_order(camera):
+            draw_entity(con, entity, fov_map, game_map, camera)
+
+        if cache is not None:
+            cache.game_state = game_state
+            spatial_index.changed = set()
+    else:
+        for x, y in spatial_index.changed:
+            if camera.in_view(x, y):
+                redraw_tile(con, entities, x, y, fov_map, game_map, camera)
+
+        spatial_index.changed.clear()
+
+    entities_done = time.perf_counter()
+
+    # Draws status panel at bottom, if anything on it changed
+    names = get_names_under_mouse(mouse, entities, fov_map, camera)
+    panel_contents = (player.fighter.hp, player.fighter.max_hp, game_map.dungeon_level, names,
+                      [(message.text, message.color) for message in message_log.messages])
+
+    if cache is None or panel_contents != cache.panel:
+        # Draws player health
+        tcod.console_set_default_foreground(con, tcod.white)
+        tcod.console_print_ex(con, 1, screen_height - 2, tcod.BKGND_NONE, tcod.LEFT,
+                              'HP: {0:02}/{1:02}'.format(player.fighter.hp, player.fighter.max_hp))
+
+        tcod.console_set_default_background(panel, tcod.black)
+        tcod.console_clear(panel)
+
+        # Prints game messages, one line at a time
+        y = 1
+        for message in message_log.messages:
+            tcod.console_set_default_foreground(panel, message.color)
+            tcod.console_print_ex(panel, message_log.x, y, tcod.BKGND_NONE, tcod.LEFT, message.text)
+            y += 1
+
+        # Renders the HP bar and current dungeon level
+        render_bar(panel, 1, 1, bar_width, 'HP', player.fighter.hp, player.fighter.max_hp,
+                   tcod.light_red, tcod.darker_red)
+        tcod.console_print_ex(panel, 1, 3, tcod.BKGND_NONE, tcod.LEFT, 'Dungeon level: {0}'.format(
+            game_map.dungeon_level))
+
+        # Displays entity name on mouse-over
+        tcod.console_set_default_foreground(panel, tcod.light_gray)
+        tcod.console_print_ex(panel, 1, 0, tcod.BKGND_NONE, tcod.LEFT, names)
+
+        if cache is not None:
+            cache.panel = panel_contents
+
+    # The offscreen consoles hold the whole frame, menus drawn over the root last frame are covered again
+    tcod.console_blit(con, 0, 0, screen_width, screen_height, 0, 0, 0)
     tcod.console_blit(panel, 0, 0, screen_width, panel_height, 0, 0, panel_y)
 
     # Displays inventory
@@ -120,21 +167,36 @@ def render_all(con, panel, entities, player, game_map, fov_map, fov_recompute, m
     elif game_state == GameStates.CHARACTER_SCREEN:
         character_screen(player, 30, 11, screen_width, screen_height)
 
-
-# Runs clear_entity on all entities
-def clear_all(con, entities):
-    for entity in entities:
-        clear_entity(con, entity)
+    if profiler:
+        profiler.add('map', map_done - start)
+        profiler.add('entities', entities_done - map_done)
+        profiler.add('panel', time.perf_counter() - entities_done)
 
 
-# Draws the entity with its properties
-def draw_entity(con, entity, fov_map, game_map):
-    # Show what is in FOV as well as stairs, if discovered previously
-    if tcod.map_is_in_fov(fov_map, entity.x, entity.y) or (entity.stairs and game_map.tiles[entity.x][entity.y].explored):
+# Draws the entity with its properties, at its position relative to the camera
+def draw_entity(con, entity, fov_map, game_map, camera):
+    if is_drawn(entity, fov_map, game_map):
+        x, y = camera.to_screen(entity.x, entity.y)
         tcod.console_set_default_foreground(con, entity.color)
-        tcod.console_put_char(con, entity.x, entity.y, entity.char, tcod.BKGND_NONE)
+        tcod.console_put_char(con, x, y, entity.char, tcod.BKGND_NONE)
+
+
+# Draws one tile's entities again - blanks it, then draws the top one that can be seen
+# The top one is the one a full redraw would draw last: highest render order, then latest in the list
+def redraw_tile(con, entities, x, y, fov_map, game_map, camera):
+    screen_x, screen_y = camera.to_screen(x, y)
+    tcod.console_put_char(con, screen_x, screen_y, ' ', tcod.BKGND_NONE)
+
+    top = None
+    for entity in entities.at(x, y):
+        if is_drawn(entity, fov_map, game_map) and (
+                top is None or (entity.render_order.value, entity.row) > (top.render_order.value, top.row)):
+            top = entity
+
+    if top is not None:
+        draw_entity(con, top, fov_map, game_map, camera)
 
 
-# Erase the character (avoids multiples of character)
-def clear_entity(con, entity):
-    tcod.console_put_char(con, entity.x, entity.y, ' ', tcod.BKGND_NONE)
+# Show what is in FOV as well as stairs, if discovered previously
+def is_drawn(entity, fov_map, game_map):
+    return tcod.map_is_in_fov(fov_map, entity.x, entity.y) or (entity.stairs and game_map.explored[entity.x, entity.y])
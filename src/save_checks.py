@@ -0,0 +1,326 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from src.components.ai import ConfusedMonster
+from src.death_functions import kill_player, make_corpse
+from src.entity_table import decode_entities, encode_entities
+from src.loader_functions.data_loaders import load_game, load_legacy_game, migrate_legacy_game, save_game
+from src.loader_functions.initialize_new_game import get_game_constants, get_game_variables
+from src.loader_functions.packing import pack_arrays, unpack_arrays
+from src.map_objects.bit_mask import BitMask, decode_runs, encode_runs
+from src.map_objects.floor_store import decode_floor
+from src.prototypes import prototype_of, spawn
+
+"""
+    Round-trip checks for the save format - the array packing, the entity tables, the run-length encoded
+    explored layer, and loading saves written by earlier versions (a version 1 binary save and the shelve save).
+    A change that breaks the format fails here instead of when a player's save stops loading.
+
+    python -m src.save_checks
+"""
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Saved by the first binary format (version 1), seed 4 after the hunter bot reached dungeon level 2
+VERSION_1_SAVE = os.path.join(SOURCE_DIRECTORY, 'save_fixtures', 'savegame_v1.yarg')
+# What the game held when the version 1 save was written
+VERSION_1_GAME = {
+    'player': (11, 27, 76, 100, 1, 175),
+    'dungeon_level': 2,
+    'entities': 21,
+    'explored': 128,
+    'floors': [1],
+    'inventory': ['Healing Potion'] * 5,
+    'game_state': 'PLAYERS_TURN',
+    'messages': 6,
+    'floor_1_explored': 1531,
+    'floor_1_entities': 8
+}
+
+# The shelve save shipped with the game
+LEGACY_SAVE = os.path.join(SOURCE_DIRECTORY, 'sav', 'savegame')
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition, message, *args):
+    if not condition:
+        raise CheckFailed(message.format(*args))
+
+
+# Everything about an entity a save has to bring back, as plain values (shelve saves never stored the prototype)
+def describe(entity):
+    fighter = entity.fighter
+    level = entity.level
+    ai = entity.ai
+
+    return {
+        'prototype': prototype_of(entity),
+        'name': entity.name,
+        'char': entity.char,
+        'color': tuple(entity.color),
+        'position': (entity.x, entity.y),
+        'blocks': entity.blocks,
+        'render_order': entity.render_order,
+        'fighter': (fighter.hp, fighter.max_hp, fighter.defense, fighter.power, fighter.xp) if fighter else None,
+        'ai': type(ai).__name__ if ai else None,
+        'confused': ((ai.number_of_turns, type(ai.previous_ai).__name__) if isinstance(ai, ConfusedMonster)
+                     else None),
+        'level': ((level.current_level, level.current_xp, level.level_up_base, level.level_up_factor) if level
+                  else None),
+        'stairs': entity.stairs.floor if entity.stairs else None,
+        'item': entity.item.use_function.__name__ if entity.item and entity.item.use_function else None
+    }
+
+
+def expect_same_entities(entities, restored):
+    expect(len(restored) == len(entities), '{0} entities came back, {1} went in', len(restored), len(entities))
+
+    for i, (entity, restored_entity) in enumerate(zip(entities, restored)):
+        before, after = describe(entity), describe(restored_entity)
+        differences = [name for name in before if before[name] != after[name]]
+        expect(not differences, 'entity {0} ({1}) came back with different {2}: {3} != {4}', i, entity.name,
+               ', '.join(differences), [before[name] for name in differences], [after[name] for name in differences])
+
+
+# Arrays of every kind the save uses come back with the same names (in order), types, shapes and values
+def check_pack_arrays():
+    arrays = {
+        'bits': np.packbits(np.random.RandomState(0).rand(80, 43) < 0.3, axis=None),
+        'bool_2d': np.random.RandomState(1).rand(7, 5) < 0.5,
+        'int32': np.array([-2 ** 31, -1, 0, 1, 2 ** 31 - 1], dtype=np.int32),
+        'uint32': np.array([0, 2 ** 32 - 1], dtype=np.uint32),
+        'uint16_runs': np.array([0, 3, 65535], dtype=np.uint16),
+        'float64': np.array([0.5, -1e300, np.inf]),
+        'empty': np.zeros(0, dtype=np.int32),
+        'empty_2d': np.zeros((0, 4), dtype=np.uint8),
+        '3d': np.arange(24, dtype=np.int16).reshape(2, 3, 4),
+        'not_contiguous': np.arange(20, dtype=np.int32).reshape(4, 5)[:, ::2]
+    }
+    meta = {'snapshot': 'abc', 'nested': {'list': [1, 2.5, None, True]}, 'text': 'remains of Orc †'}
+
+    for expected_meta in (meta, None):
+        restored, restored_meta = unpack_arrays(pack_arrays(arrays, expected_meta))
+
+        expect(list(restored) == list(arrays), 'array names came back as {0}', list(restored))
+        expect(restored_meta == expected_meta, 'metadata came back as {0}', restored_meta)
+
+        for name, array in arrays.items():
+            expect(restored[name].dtype == array.dtype, '{0} came back as {1}', name, restored[name].dtype)
+            expect(restored[name].shape == array.shape, '{0} came back with shape {1}', name, restored[name].shape)
+            expect(np.array_equal(restored[name], array), '{0} came back with different values', name)
+
+
+# Living, dead, confused and levelled up entities of every prototype come back as they were, in order
+def check_entity_table():
+    player = spawn('player', 5, 5)
+    player.level.current_level = 3
+    player.level.current_xp = 42
+    player.fighter.max_hp = 140
+    player.fighter.hp = 90
+    player.fighter.power = 6
+    player.fighter.defense = 3
+
+    confused_orc = spawn('orc', 6, 5)
+    confused_orc.ai = ConfusedMonster(confused_orc.ai, 7)
+    confused_orc.ai.owner = confused_orc
+
+    # Confusion runs out on the monster's next turn
+    worn_off_orc = spawn('orc', 7, 5)
+    worn_off_orc.ai = ConfusedMonster(worn_off_orc.ai, 0)
+    worn_off_orc.ai.owner = worn_off_orc
+
+    wounded_troll = spawn('troll', 8, 5)
+    wounded_troll.fighter.hp = 4
+
+    dead_troll = spawn('troll', 9, 5)
+    dead_troll.fighter.hp = 0
+    make_corpse(dead_troll)
+
+    dead_orc = spawn('orc', 9, 5)
+    make_corpse(dead_orc)
+
+    entities = [spawn('stairs_up', 1, 1, floor=2), dead_troll, player, confused_orc, spawn('healing_potion', 2, 2),
+                worn_off_orc, wounded_troll, spawn('fireball_scroll', 3, 2), dead_orc,
+                spawn('stairs_down', 0, 0, floor=4), spawn('lightning_scroll', 3, 3),
+                spawn('confusion_scroll', 3, 4)]
+
+    restored = decode_entities(unpack_arrays(pack_arrays(encode_entities(entities, 'floor'), None))[0], 'floor')
+    expect_same_entities(entities, restored)
+
+    # Entities of a kind are copied from one template, none of them may share a component with another
+    restored.extend(decode_entities(encode_entities(entities)))
+    components = [(entity, component) for entity in restored for component in (
+        entity.fighter, entity.ai, entity.item, entity.inventory, entity.stairs, entity.level) if component]
+
+    expect(len({id(component) for entity, component in components}) == len(components),
+           'entities came back sharing components')
+    expect(all(component.owner is entity for entity, component in components),
+           'components came back owned by another entity')
+    expect(len({id(entity.inventory.items) for entity in restored if entity.inventory}) ==
+           len([entity for entity in restored if entity.inventory]), 'inventories came back sharing their items')
+
+    # A dead player is saved on the death screen
+    dead_player = spawn('player', 4, 4)
+    dead_player.fighter.hp = -3
+    kill_player(dead_player)
+
+    expect_same_entities([dead_player], decode_entities(encode_entities([dead_player])))
+
+    expect(decode_entities(encode_entities([])) == [], 'an empty table came back with entities')
+
+
+# Masks of every shape of run come back unchanged, through the runs and through the packed BitMask
+def check_explored_runs():
+    random = np.random.RandomState(2)
+
+    masks = {
+        'all False': np.zeros((80, 43), dtype=bool),
+        'all True': np.ones((80, 43), dtype=bool),
+        'random': random.rand(80, 43) < 0.5,
+        'sparse': random.rand(200, 200) < 0.01,
+        'starts True': np.arange(80 * 43).reshape(80, 43) < 100,
+        'ends True': np.arange(80 * 43).reshape(80, 43) >= 100,
+        'single tile True': np.ones((1, 1), dtype=bool),
+        'single tile False': np.zeros((1, 1), dtype=bool),
+        'no tiles': np.zeros((0, 43), dtype=bool),
+        # One run longer than fits in 16 bits
+        'long run': np.ones((300, 300), dtype=bool)
+    }
+
+    for name, mask in masks.items():
+        runs = encode_runs(mask)
+        expect(runs.dtype in (np.uint16, np.uint32), '{0}: runs stored as {1}', name, runs.dtype)
+        expect(runs.sum() == mask.size, '{0}: runs cover {1} tiles, not {2}', name, runs.sum(), mask.size)
+        expect(np.array_equal(decode_runs(runs, mask.shape), mask), '{0}: runs decode to a different mask', name)
+
+        if mask.size:
+            expect(np.array_equal(BitMask.from_array(mask).to_array(), mask), '{0}: BitMask changes the mask', name)
+
+    expect(encode_runs(masks['long run']).dtype == np.uint32, 'a run over 65535 tiles is not stored as uint32')
+
+
+# A game saved and loaded again is the same game, stored floors included
+def check_save_round_trip():
+    constants = get_game_constants()
+    constants['pregenerate_floors'] = False
+
+    player, entities, game_map, message_log, game_state = get_game_variables(constants, 4)
+
+    directory = tempfile.mkdtemp(prefix='yarg-save-check-')
+    try:
+        path = os.path.join(directory, 'savegame.yarg')
+        save_game(player, entities, game_map, message_log, game_state, path)
+
+        loaded_player, loaded_entities, loaded_map, loaded_log, loaded_state = load_game(
+            path, journal_path=os.path.join(directory, 'none.journal'))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    expect_same_entities(entities, loaded_entities)
+    expect_same_entities(player.inventory.items, loaded_player.inventory.items)
+    expect(loaded_entities[entities.index(player)] is loaded_player, 'the player is not where it was in the list')
+
+    for name in ('blocked', 'block_sight', 'explored'):
+        expect(np.array_equal(np.asarray(getattr(loaded_map, name)), np.asarray(getattr(game_map, name))),
+               'the {0} layer came back different', name)
+
+    for stream in ('map', 'spawn', 'ai'):
+        expect(getattr(loaded_map.rng, stream).getstate() == getattr(game_map.rng, stream).getstate(),
+               'the {0} random stream came back in a different state', stream)
+
+    expect([message.text for message in loaded_log.messages] == [message.text for message in message_log.messages],
+           'the message log came back different')
+    expect(loaded_state == game_state, 'the game state came back as {0}', loaded_state)
+
+
+# A save written by the first binary format still loads, including its stored floor
+def check_version_1_save():
+    with open(VERSION_1_SAVE, 'rb') as save_file:
+        expect(save_file.read(6) == b'YARG\x01\x00', '{0} is not a version 1 save', VERSION_1_SAVE)
+
+    # Loading reads the save only, the journal path doesn't exist
+    player, entities, game_map, message_log, game_state = load_game(
+        VERSION_1_SAVE, journal_path=VERSION_1_SAVE + '.no-journal')
+
+    expected = VERSION_1_GAME
+    loaded = {
+        'player': (player.x, player.y, player.fighter.hp, player.fighter.max_hp, player.level.current_level,
+                   player.level.current_xp),
+        'dungeon_level': game_map.dungeon_level,
+        'entities': len(entities),
+        'explored': int(np.asarray(game_map.explored).sum()),
+        'floors': [dungeon_level for dungeon_level, record in game_map.floors.records()],
+        'inventory': [item.name for item in player.inventory.items],
+        'game_state': game_state.name,
+        'messages': len(message_log.messages)
+    }
+
+    layers, floor_entities = decode_floor(game_map.floors.read(1))
+    loaded['floor_1_explored'] = int(np.asarray(layers['explored']).sum())
+    loaded['floor_1_entities'] = len(floor_entities)
+
+    differences = [name for name in expected if expected[name] != loaded[name]]
+    expect(not differences, 'the version 1 save loaded with different {0}: {1} != {2}', ', '.join(differences),
+           [loaded[name] for name in differences], [expected[name] for name in differences])
+
+
+# The shelve save of older versions converts to the binary format without losing anything
+def check_legacy_save():
+    player, entities, game_map, message_log, game_state = load_legacy_game(LEGACY_SAVE)
+
+    directory = tempfile.mkdtemp(prefix='yarg-save-check-')
+    try:
+        path = os.path.join(directory, 'savegame.yarg')
+        migrate_legacy_game(LEGACY_SAVE, path)
+        migrated_player, migrated_entities, migrated_map, migrated_log, migrated_state = load_game(
+            path, journal_path=os.path.join(directory, 'none.journal'))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    expect_same_entities(entities, migrated_entities)
+    expect_same_entities(player.inventory.items, migrated_player.inventory.items)
+    expect(np.array_equal(np.asarray(migrated_map.explored), np.asarray(game_map.explored)),
+           'the explored layer changed in the conversion')
+    expect(migrated_state == game_state, 'the game state came back as {0}', migrated_state)
+
+
+CHECKS = {
+    'pack_arrays': check_pack_arrays,
+    'entity_table': check_entity_table,
+    'explored_runs': check_explored_runs,
+    'save_round_trip': check_save_round_trip,
+    'version_1_save': check_version_1_save,
+    'legacy_save': check_legacy_save
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks that saves round-trip and that older saves still load.')
+    parser.add_argument('--only', help='comma separated check names to run ({0})'.format(', '.join(CHECKS)))
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(CHECKS)
+    failures = 0
+
+    for name in names:
+        try:
+            CHECKS[name]()
+            print('{0:<20} ok'.format(name))
+        except CheckFailed as error:
+            failures += 1
+            print('{0:<20} FAILED - {1}'.format(name, error))
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import json
+import multiprocessing
+import os
+from collections import Counter
+
+from src.bot_policies import POLICIES
+from src.game_states import GameStates
+from src.loader_functions.initialize_new_game import get_game_constants, get_game_variables
+from src.memory_report import memory_report, print_report
+from src.tracing import Tracer
+from src.turn_engine import TurnEngine
+from src.turn_results import Died
+
+"""
+    Batch game simulator - plays complete seeded games headlessly across a process pool
+    and aggregates the results, for tuning spawn tables and balance.
+
+    python -m src.simulate --games 10000 --policy hunter
+    python -m src.simulate --memory-report --max-turns 500
+    python -m src.simulate --trace trace.json --max-turns 2000
+"""
+
+# Turns between samples of the XP curve
+XP_SAMPLE_INTERVAL = 50
+
+
+# Plays one complete game with the given policy and returns a summary of the run
+# With a tracer every step is traced, the policy choosing its action as the input phase
+def run_game(seed, policy_name, max_turns, tracer=None):
+    constants = get_game_constants()
+
+    # Nobody is waiting on the stairs here, games in the pool already keep every core busy
+    constants['pregenerate_floors'] = False
+
+    engine = TurnEngine(*get_game_variables(constants, seed), constants)
+    engine.tracer = tracer
+    policy = POLICIES[policy_name]()
+
+    total_xp = 0
+    xp_curve = []
+    max_depth = engine.game_map.dungeon_level
+    idle_steps = 0
+
+    while engine.turn < max_turns and engine.game_state != GameStates.PLAYER_DEAD:
+        if tracer:
+            tracer.begin('input', 'phase')
+
+        action = policy.next_action(engine)
+
+        if tracer:
+            tracer.end()
+
+        if action is None:
+            break
+
+        turn = engine.turn
+        results = engine.step(action)
+
+        total_xp += sum(result.xp for result in results if type(result) is Died)
+        max_depth = max(max_depth, engine.game_map.dungeon_level)
+
+        if engine.turn != turn and engine.turn % XP_SAMPLE_INTERVAL == 0:
+            xp_curve.append(total_xp)
+
+        # Stops policies that keep issuing actions which never use up a turn
+        idle_steps = idle_steps + 1 if engine.turn == turn else 0
+        if idle_steps > 100:
+            break
+
+    if engine.game_state == GameStates.PLAYER_DEAD:
+        cause = 'killed by {0}'.format(engine.killed_by or 'unknown')
+    elif engine.turn >= max_turns:
+        cause = 'survived'
+    else:
+        cause = 'stuck'
+
+    return {
+        'seed': seed,
+        'depth': max_depth,
+        'turns': engine.turn,
+        'cause': cause,
+        'xp': total_xp,
+        'character_level': engine.player.level.current_level,
+        'xp_curve': xp_curve
+    }
+
+
+# Unpacks pool arguments
+def _run_game(args):
+    return run_game(*args)
+
+
+# Averages the per game results into one report
+def aggregate(runs):
+    count = len(runs)
+
+    def mean(values):
+        return sum(values) / len(values) if values else 0
+
+    # Mean total XP at each sample point, over the games still running at that point
+    longest = max((len(run['xp_curve']) for run in runs), default=0)
+    xp_curve = []
+
+    for i in range(longest):
+        samples = [run['xp_curve'][i] for run in runs if len(run['xp_curve']) > i]
+        xp_curve.append({'turn': (i + 1) * XP_SAMPLE_INTERVAL, 'mean_xp': mean(samples), 'games': len(samples)})
+
+    depths = sorted(run['depth'] for run in runs)
+
+    return {
+        'games': count,
+        'depth': {
+            'mean': mean(depths),
+            'median': depths[count // 2] if depths else 0,
+            'max': depths[-1] if depths else 0,
+            'histogram': dict(sorted(Counter(depths).items()))
+        },
+        'turns': {
+            'mean': mean([run['turns'] for run in runs]),
+            'max': max((run['turns'] for run in runs), default=0)
+        },
+        'causes': dict(Counter(run['cause'] for run in runs).most_common()),
+        'xp': {
+            'mean': mean([run['xp'] for run in runs]),
+            'mean_character_level': mean([run['character_level'] for run in runs])
+        },
+        'xp_curve': xp_curve
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs seeded games with a bot policy and reports the results.')
+    parser.add_argument('--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game, the rest count up from it')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='hunter', help='bot policy to play with')
+    parser.add_argument('--max-turns', type=int, default=5000, help='turn limit per game')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--runs', help='also write every per game result to this JSON file')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='play one game (the first seed, up to the turn limit) and report its memory use instead')
+    parser.add_argument('--output', help='with --memory-report, also write the report to this JSON file')
+    parser.add_argument('--trace', help='play one game (the first seed, up to the turn limit) and write a Chrome '
+                                        'trace of its turns to this JSON file instead')
+    args = parser.parse_args()
+
+    if args.memory_report:
+        report = memory_report(args.seed, args.policy, args.max_turns)
+        print_report(report)
+
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+
+        return
+
+    if args.trace:
+        tracer = Tracer('simulate seed {0}'.format(args.seed))
+        run = run_game(args.seed, args.policy, args.max_turns, tracer)
+        tracer.save(args.trace)
+
+        print(json.dumps({key: value for key, value in run.items() if key != 'xp_curve'}, indent=2))
+        return
+
+    jobs = [(args.seed + i, args.policy, args.max_turns) for i in range(args.games)]
+
+    with multiprocessing.Pool(args.workers) as pool:
+        runs = sorted(pool.imap_unordered(_run_game, jobs, chunksize=max(1, len(jobs) // (args.workers * 8))),
+                      key=lambda run: run['seed'])
+
+    if args.runs:
+        with open(args.runs, 'w') as runs_file:
+            json.dump(runs, runs_file)
+
+    print(json.dumps(aggregate(runs), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+    Base for the classes the game makes many of (entities, their components, messages, rectangles).
+    Their attributes are kept in __slots__ rather than a dict per instance.
+    Saves made before they were slotted hold a dict of attributes, which is set back attribute by attribute.
+"""
+
+# Stands in for a slot that hasn't been set
+UNSET = object()
+
+# Slot names of each class and its bases, worked out on its first copy
+SLOT_NAMES = {}
+
+
+# Every slot of a class, from the class and its bases
+def slot_names(cls):
+    names = SLOT_NAMES.get(cls)
+
+    if names is None:
+        names = SLOT_NAMES[cls] = tuple(name for base in cls.__mro__ for name in getattr(base, '__slots__', ()))
+
+    return names
+
+
+class Slotted:
+    __slots__ = ()
+
+    # Every slot that has been set, from the class and its bases
+    def __getstate__(self):
+        state = {}
+
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+
+        return state
+
+    # A shallow copy of every slot that has been set, without going through __getstate__ and __setstate__
+    # Slots are copied as they are, so the object must not be reading its fields from a component store
+    def copy(self):
+        cls = type(self)
+        copied = cls.__new__(cls)
+
+        for name in slot_names(cls):
+            value = getattr(self, name, UNSET)
+
+            if value is not UNSET:
+                setattr(copied, name, value)
+
+        return copied
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
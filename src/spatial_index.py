@@ -0,0 +1,168 @@
+import numpy as np
+
+from src.component_store import FIGHTER, ComponentStore
+
+"""
+    Spatial index for looking up entities by map position.
+    Entities register themselves on the floor's EntityList, which keeps the index in step
+    as entities are spawned, picked up, dropped and moved.
+    The list also keeps the floor's component store (see component_store.py), for queries over every entity.
+    Area queries (within a radius, nearest to a tile) gather candidates from the index cells around the tile
+    when that covers fewer cells than there are entities, then measure distances over the store's columns.
+"""
+
+
+class SpatialIndex:
+    def __init__(self):
+        # (x, y) -> entities standing on that tile
+        self.cells = {}
+        # Tiles whose entities changed since the renderer last drew them, None until a renderer starts watching
+        self.changed = None
+
+    # Adds an entity at its current position
+    def add(self, entity):
+        self.cells.setdefault((entity.x, entity.y), []).append(entity)
+
+        if self.changed is not None:
+            self.changed.add((entity.x, entity.y))
+
+    # Removes an entity from the tile it was last seen on
+    def remove(self, entity, x=None, y=None):
+        if x is None:
+            x, y = entity.x, entity.y
+
+        cell = self.cells[(x, y)]
+        cell.remove(entity)
+
+        if not cell:
+            del self.cells[(x, y)]
+
+        if self.changed is not None:
+            self.changed.add((x, y))
+
+    # Marks an entity's tile for redrawing after it changed in place (e.g. died)
+    def touch(self, entity):
+        if self.changed is not None:
+            self.changed.add((entity.x, entity.y))
+
+    # Moves an entity from its old tile to its current one
+    def move(self, entity, old_x, old_y):
+        self.remove(entity, old_x, old_y)
+        self.add(entity)
+
+    # All entities on a tile
+    def at(self, x, y):
+        return list(self.cells.get((x, y), ()))
+
+    # First blocking entity on a tile
+    def blocking_at(self, x, y):
+        for entity in self.cells.get((x, y), ()):
+            if entity.blocks:
+                return entity
+
+        return None
+
+    # All entities on the tiles up to reach tiles away (along each axis) from a tile
+    def near(self, x, y, reach):
+        cells = self.cells
+        return [entity for cell_x in range(x - reach, x + reach + 1) for cell_y in range(y - reach, y + reach + 1)
+                for entity in cells.get((cell_x, cell_y), ())]
+
+
+# The flat list of entities on a floor, with a spatial index and component store kept alongside it
+class EntityList(list):
+    def __init__(self, entities=()):
+        super().__init__()
+        self.spatial_index = SpatialIndex()
+        self.store = ComponentStore()
+        self.extend(entities)
+
+    def append(self, entity):
+        super().append(entity)
+        self.store.add(entity)
+        entity.spatial_index = self.spatial_index
+        self.spatial_index.add(entity)
+
+    # Many entities at once (a floor being loaded) go into the store together
+    def extend(self, entities):
+        entities = list(entities)
+        super().extend(entities)
+        self.store.extend(entities)
+
+        for entity in entities:
+            entity.spatial_index = self.spatial_index
+            self.spatial_index.add(entity)
+
+    def remove(self, entity):
+        super().remove(entity)
+        self.spatial_index.remove(entity)
+        entity.spatial_index = None
+        self.store.remove(entity)
+
+    # Changes that don't go through append, extend and remove would leave the index and the store behind the list
+    def _unsupported(self, *args, **kwargs):
+        raise TypeError('EntityList only changes through append, extend and remove')
+
+    insert = pop = clear = sort = reverse = _unsupported
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _unsupported
+
+    # All entities on a tile
+    def at(self, x, y):
+        return self.spatial_index.at(x, y)
+
+    # First blocking entity on a tile
+    def blocking_at(self, x, y):
+        return self.spatial_index.blocking_at(x, y)
+
+    # Entities with all of the given components (bits from component_store.py), in list order
+    # Optionally only those with hit points left, and those in the field of view
+    def select(self, components, fov_map=None, living=False):
+        return self.store.select(components, fov_map, living)
+
+    # Fighters with hit points left, optionally only those in the field of view
+    def living_fighters(self, fov_map=None):
+        return self.store.select(FIGHTER, fov_map, living=True)
+
+    # Entities (with all of the given components) within a radius of a tile, in list order
+    # Optionally only those in the field of view
+    def within(self, x, y, radius, components=0, fov_map=None):
+        store = self.store
+        rows = store.rows_with(components, self.rows_near(x, y, radius), fov_map)
+        return store.entities_at(rows[store.distances_squared(rows, x, y) <= radius * radius])
+
+    # The k entities (with all of the given components) nearest to a tile, nearest first, ties in list order
+    # Optionally only those nearer than max_distance, those in the field of view, and leaving one entity out
+    def nearest(self, x, y, k=1, max_distance=None, components=0, fov_map=None, exclude=None):
+        store = self.store
+        rows = store.rows_with(components, None if max_distance is None else self.rows_near(x, y, max_distance),
+                               fov_map)
+
+        if exclude is not None and exclude.store is store:
+            rows = rows[rows != exclude.row]
+
+        distances = store.distances_squared(rows, x, y)
+
+        if max_distance is not None:
+            nearer = distances < max_distance * max_distance
+            rows = rows[nearer]
+            distances = distances[nearer]
+
+        return store.entities_at(rows[np.argsort(distances, kind='stable')[:k]])
+
+    # Rows of the entities that can be within a distance of a tile, in order
+    # None (every row) when the area around the tile has more cells than there are entities
+    def rows_near(self, x, y, distance):
+        reach = int(distance)
+
+        if (2 * reach + 1) ** 2 >= len(self):
+            return None
+
+        return np.array(sorted(entity.row for entity in self.spatial_index.near(x, y, reach)), dtype=np.intp)
+
+    # Entities in the camera's view, in the order they are drawn
+    def in_render_order(self, camera):
+        return self.store.in_render_order(camera.x, camera.y, camera.width, camera.height)
+
+    # The index and store are rebuilt rather than saved
+    def __reduce__(self):
+        return EntityList, (list(self),)
@@ -0,0 +1,85 @@
+import json
+import os
+import time
+from collections import deque
+
+"""
+    Turn tracing - spans around the phases of a turn (input, the player's action, its results, levelling up,
+    the enemy phase) and around every monster's AI, saved as Chrome trace events.
+    Load the file in chrome://tracing or https://ui.perfetto.dev to find the turn, and the monster, that was slow.
+    Traced code holds a tracer, or None while tracing is off, and checks it before every call,
+    so tracing that is off costs nothing more than that check.
+
+    In the game F5 starts tracing and stops it again, saving the trace.
+    python -m src.simulate --trace trace.json --max-turns 2000
+"""
+
+TRACE_PATH = 'sav/trace.json'
+
+# Events kept, the oldest are dropped past this so a long session can't run out of memory (about 100 MB)
+MAX_EVENTS = 250000
+
+
+class Tracer:
+    def __init__(self, process_name='yarg', max_events=MAX_EVENTS):
+        # The latest finished events, in the Chrome trace event format
+        self.events = deque(maxlen=max_events)
+        # Events dropped to make room for newer ones
+        self.dropped = 0
+        # Spans begun but not ended yet, innermost last
+        self.open_spans = []
+
+        # Timestamps are in microseconds since the tracer was made
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+        self.metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                          'args': {'name': process_name}}]
+
+    # Microseconds since the tracer was made
+    def now(self):
+        return (time.perf_counter() - self.origin) * 1e6
+
+    # Begins a span, args are shown with it in the trace viewer
+    def begin(self, name, category, args=None):
+        self.open_spans.append((name, category, args, self.now()))
+
+    # Ends the innermost span, adding any args only known at its end
+    def end(self, args=None):
+        name, category, span_args, start = self.open_spans.pop()
+
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': self.now() - start,
+                 'pid': self.pid, 'tid': 0}
+
+        if span_args or args:
+            event['args'] = {**(span_args or {}), **(args or {})}
+
+        self.add(event)
+
+    # Drops the innermost span without keeping it, for one that turned out to have nothing in it
+    def cancel(self):
+        self.open_spans.pop()
+
+    # Marks a moment, such as taking the stairs
+    def instant(self, name, category, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'i', 's': 't', 'ts': self.now(), 'pid': self.pid, 'tid': 0}
+
+        if args:
+            event['args'] = args
+
+        self.add(event)
+
+    # Keeps an event, dropping the oldest one when full
+    def add(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+
+        self.events.append(event)
+
+    # Writes the finished events kept to a JSON file, with the number dropped before them
+    def save(self, path=TRACE_PATH):
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': self.metadata + list(self.events), 'displayTimeUnit': 'ms',
+                       'otherData': {'dropped_events': self.dropped}}, trace_file)
+
+        return os.path.abspath(path)
@@ -0,0 +1,411 @@
+import time
+from itertools import groupby
+
+import tcod
+
+from src.component_store import AI
+from src.death_functions import kill_monster, kill_player
+from src.entity import get_blocking_entities_at_location
+from src.fov_functions import initialize_fov, recompute_fov
+from src.game_messages import Message
+from src.game_states import GameStates
+from src.map_objects.floor_pregenerator import FloorPregenerator
+from src.map_objects.pathing import PathingGrid
+from src.turn_results import (Died, ExitRequested, FloorChanged, ItemAdded, ItemConsumed, ItemDropped, LogMessage,
+                              TargetingCancelled, TargetingStarted)
+
+"""
+    Headless turn engine - owns the game objects and runs the game logic one action at a time.
+    Nothing in here needs a window, the tcod front end in engine.py drives it.
+"""
+
+
+class TurnEngine:
+    def __init__(self, player, entities, game_map, message_log, game_state, constants):
+        self.player = player
+        self.entities = entities
+        self.game_map = game_map
+        self.message_log = message_log
+        self.game_state = game_state
+        self.constants = constants
+
+        # Save previous game state (for inventory support)
+        self.previous_game_state = game_state
+
+        # Saves targeting item
+        self.targeting_item = None
+
+        # Number of enemy phases run so far, and the name of whatever killed the player
+        self.turn = 0
+        self.killed_by = None
+
+        # Frame profiler of the front end, given the time spent on field of view and the enemy phase
+        self.profiler = None
+        # Tracer given spans around the phases of each step and every monster's AI, None while tracing is off
+        self.tracer = None
+
+        # Field of view - fov_outdated is set when the player moves or changes floor,
+        # fov_recompute stays set until the front end has redrawn the map
+        self.fov_map = initialize_fov(game_map)
+        self.fov_outdated = True
+        self.fov_recompute = True
+        self.recompute_fov()
+
+        # Builds the floor below in the background, so taking the stairs doesn't stall the game
+        self.pregenerator = FloorPregenerator(constants) if constants['pregenerate_floors'] else None
+        self.pregenerate_next_floor()
+
+    # Asks for the floor below the current one to be generated ahead of time
+    def pregenerate_next_floor(self):
+        if self.pregenerator:
+            self.pregenerator.request(self.game_map, self.game_map.dungeon_level + 1)
+
+    # Updates field of view around the player, marking everything in view as explored
+    def recompute_fov(self):
+        if self.tracer:
+            self.tracer.begin('fov', 'phase')
+
+        start = time.perf_counter()
+
+        radius = self.constants['fov_radius']
+        recompute_fov(self.fov_map, self.player.x, self.player.y, radius, self.constants['fov_light_walls'],
+                      self.constants['fov_algorithm'])
+
+        # Only the area around the player can have come into view (a radius of 0 means unlimited)
+        if radius > 0:
+            view = (slice(max(self.player.x - radius, 0), self.player.x + radius + 1),
+                    slice(max(self.player.y - radius, 0), self.player.y + radius + 1))
+        else:
+            view = (slice(None), slice(None))
+
+        self.game_map.explored[view] |= self.fov_map.fov[view]
+        self.fov_outdated = False
+        self.fov_recompute = True
+
+        if self.profiler:
+            self.profiler.add('fov', time.perf_counter() - start)
+
+        if self.tracer:
+            self.tracer.end()
+
+    # Runs one action (the combined keyboard and mouse action dicts) through to the end of the enemy phase
+    # Returns every result produced; ExitRequested means the player asked to leave the game
+    # and FloorChanged means the player took the stairs
+    def step(self, action):
+        tracer = self.tracer
+
+        if tracer:
+            tracer.begin('step', 'turn', {'turn': self.turn, 'action': dict(action)})
+            tracer.begin('player_action', 'phase')
+
+        player_turn_results = self.take_player_action(action)
+
+        if tracer:
+            tracer.end({'results': len(player_turn_results)})
+
+        if any(type(result) is ExitRequested for result in player_turn_results):
+            if tracer:
+                tracer.end()
+
+            return player_turn_results
+
+        if tracer:
+            tracer.begin('results', 'phase')
+
+        self.apply_results(player_turn_results)
+
+        if tracer:
+            tracer.end()
+
+        # The player may have moved, so enemies act on the up to date field of view
+        if self.fov_outdated:
+            self.recompute_fov()
+
+        if self.game_state == GameStates.ENEMY_TURN:
+            start = time.perf_counter()
+            player_turn_results.extend(self.take_enemy_turns())
+
+            if self.profiler:
+                self.profiler.add('enemies', time.perf_counter() - start)
+
+        if tracer:
+            tracer.end({'game_state': self.game_state.name})
+
+        return player_turn_results
+
+    # Handles the player's action, returning the results to be processed
+    def take_player_action(self, action):
+        player = self.player
+        entities = self.entities
+        message_log = self.message_log
+
+        # Action handlers
+        move = action.get('move')
+        wait = action.get('wait')
+        pickup = action.get('pickup')
+        show_inventory = action.get('show_inventory')
+        drop_inventory = action.get('drop_inventory')
+        inventory_index = action.get('inventory_index')
+        level_up = action.get('level_up')
+        show_character_screen = action.get('show_character_screen')
+        take_stairs_down = action.get('take_stairs_down')
+        take_stairs_up = action.get('take_stairs_up')
+        exit = action.get('exit')
+
+        # Mouse action handlers
+        left_click = action.get('left_click')
+        right_click = action.get('right_click')
+
+        # List to hold for result of battles
+        player_turn_results = []
+
+        # Player turn and handling of item pickups
+        if move and self.game_state == GameStates.PLAYERS_TURN:
+            dx, dy = move
+            destination_x = player.x + dx
+            destination_y = player.y + dy
+
+            if not self.game_map.is_blocked(destination_x, destination_y):
+                target = get_blocking_entities_at_location(entities, destination_x, destination_y)
+
+                if target:
+                    attack_results = player.fighter.attack(target)
+                    player_turn_results.extend(attack_results)
+                else:
+                    player.move(dx, dy)
+                    self.fov_outdated = True
+
+                self.game_state = GameStates.ENEMY_TURN
+
+        # Player waits for a turn (and does nothing)
+        elif wait and self.game_state == GameStates.PLAYERS_TURN:
+            message_log.add_message(Message('You twiddle your thumbs for a turn.', tcod.turquoise))
+            self.game_state = GameStates.ENEMY_TURN
+
+        # Pickup items
+        elif pickup and self.game_state == GameStates.PLAYERS_TURN:
+            for entity in entities.at(player.x, player.y):
+                if entity.item:
+                    pickup_results = player.inventory.add_item(entity)
+                    player_turn_results.extend(pickup_results)
+
+                    break
+            else:
+                message_log.add_message(Message('There is nothing here to pick up.', tcod.yellow))
+
+        # Show inventory
+        if show_inventory:
+            self.previous_game_state = self.game_state
+            self.game_state = GameStates.SHOW_INVENTORY
+
+        # Drops item from inventory
+        if drop_inventory:
+            self.previous_game_state = self.game_state
+            self.game_state = GameStates.DROP_INVENTORY
+
+        # Use or drop item (only when in inventory game state and not dead)
+        if inventory_index is not None and self.previous_game_state != GameStates.PLAYER_DEAD and inventory_index < len(
+                player.inventory.items):
+            item = player.inventory.items[inventory_index]
+
+            if self.game_state == GameStates.SHOW_INVENTORY:
+                player_turn_results.extend(player.inventory.use(item, entities=entities, fov_map=self.fov_map))
+            elif self.game_state == GameStates.DROP_INVENTORY:
+                player_turn_results.extend(player.inventory.drop_item(item))
+
+        # Leveling up
+        if level_up:
+            if level_up == 'hp':
+                player.fighter.max_hp += 20
+                player.fighter.hp += 20
+            elif level_up == 'str':
+                player.fighter.power += 1
+            elif level_up == 'def':
+                player.fighter.defense += 1
+
+            self.game_state = self.previous_game_state
+
+        # Character screen, switches to appropriate game state
+        if show_character_screen:
+            self.previous_game_state = self.game_state
+            self.game_state = GameStates.CHARACTER_SCREEN
+
+        # Goes down (or back up) a flight of stairs, to a new floor or one visited before
+        if (take_stairs_down or take_stairs_up) and self.game_state == GameStates.PLAYERS_TURN:
+            dungeon_level = self.game_map.dungeon_level
+
+            for entity in entities.at(player.x, player.y):
+                if entity.stairs and (entity.stairs.floor > dungeon_level) == bool(take_stairs_down):
+                    self.entities = entities = self.game_map.change_floor(entity.stairs.floor, player, entities,
+                                                                          message_log, self.constants,
+                                                                          self.pregenerator)
+                    self.fov_map = initialize_fov(self.game_map)
+                    self.fov_outdated = True
+                    self.pregenerate_next_floor()
+                    player_turn_results.append(FloorChanged())
+
+                    if self.tracer:
+                        self.tracer.instant('stairs', 'turn', {'dungeon_level': self.game_map.dungeon_level})
+
+                    break
+            else:
+                message_log.add_message(Message('There are no stairs here.', tcod.yellow))
+
+        # Targeting mode is active - left mouse click sets target, right mouse click cancels
+        if self.game_state == GameStates.TARGETING:
+            if left_click:
+                target_x, target_y = left_click
+
+                item_use_results = player.inventory.use(self.targeting_item, entities=entities, fov_map=self.fov_map,
+                                                        target_x=target_x, target_y=target_y)
+                player_turn_results.extend(item_use_results)
+            elif right_click:
+                player_turn_results.append(TargetingCancelled())
+
+        # Reverts back to previous game state while viewing inventory; otherwise, the front end saves and quits
+        if exit:
+            if self.game_state in (GameStates.SHOW_INVENTORY, GameStates.DROP_INVENTORY,
+                                   GameStates.CHARACTER_SCREEN):
+                self.game_state = self.previous_game_state
+            elif self.game_state == GameStates.TARGETING:
+                player_turn_results.append(TargetingCancelled())
+            else:
+                player_turn_results.append(ExitRequested())
+
+        return player_turn_results
+
+    # Applies results in the order they were made
+    # Each run of consecutive results of one type goes to its type's handler in one call (so the deaths from one
+    # fireball are applied together), results with no handler here are for the front end
+    def apply_results(self, results):
+        handlers = self.result_handlers
+
+        for result_type, run in groupby(results, type):
+            handler = handlers.get(result_type)
+
+            if handler:
+                handler(self, list(run))
+
+    # Displays supplied messages
+    def log_messages(self, results):
+        for result in results:
+            self.message_log.add_message(result.message)
+
+    # Player or monsters have died, the player gains the experience monsters are worth
+    def apply_deaths(self, deaths):
+        for death in deaths:
+            if death.entity == self.player:
+                message, self.game_state = kill_player(death.entity)
+            else:
+                message = kill_monster(death.entity)
+
+            self.message_log.add_message(message)
+
+            if death.xp:
+                self.gain_xp(death.xp)
+
+    # Experience, levelling up when enough has been gained
+    def gain_xp(self, xp):
+        player = self.player
+        message_log = self.message_log
+
+        if self.tracer:
+            self.tracer.begin('level_up', 'phase', {'xp': xp})
+
+        leveled_up = player.level.add_xp(xp)
+        message_log.add_message(Message('You gain {0} experience points.'.format(xp)))
+
+        if leveled_up:
+            message_log.add_message(Message('You have leveled up and reached level {0}!'.format(
+                player.level.current_level), tcod.green))
+            self.previous_game_state = self.game_state
+            self.game_state = GameStates.LEVEL_UP
+
+        if self.tracer:
+            self.tracer.end({'leveled_up': leveled_up})
+
+    # Items were added to inventory
+    def add_items(self, results):
+        for result in results:
+            self.entities.remove(result.item)
+
+        self.game_state = GameStates.ENEMY_TURN
+
+    # Item was used
+    def consume_items(self, results):
+        self.game_state = GameStates.ENEMY_TURN
+
+    # Items were dropped
+    def drop_items(self, results):
+        for result in results:
+            self.entities.append(result.item)
+
+        self.game_state = GameStates.ENEMY_TURN
+
+    # Targeting is activated, switch to targeting mode
+    def start_targeting(self, results):
+        for result in results:
+            self.previous_game_state = GameStates.PLAYERS_TURN
+            self.game_state = GameStates.TARGETING
+
+            self.targeting_item = result.item
+
+            self.message_log.add_message(self.targeting_item.item.targeting_message)
+
+    # Targeting was cancelled, revert to previous game state
+    def cancel_targeting(self, results):
+        for result in results:
+            self.game_state = self.previous_game_state
+
+            self.message_log.add_message(Message('Targeting cancelled.'))
+
+    # Handler of each type of result, given a run of consecutive results of that type
+    result_handlers = {
+        LogMessage: log_messages,
+        Died: apply_deaths,
+        ItemAdded: add_items,
+        ItemConsumed: consume_items,
+        ItemDropped: drop_items,
+        TargetingStarted: start_targeting,
+        TargetingCancelled: cancel_targeting
+    }
+
+    # Enemies turn, returns the results of every monster's action
+    def take_enemy_turns(self):
+        player = self.player
+        tracer = self.tracer
+        results = []
+
+        self.turn += 1
+
+        if tracer:
+            tracer.begin('enemy_phase', 'phase', {'turn': self.turn})
+
+        # One walkability grid for the whole phase, updated as monsters move
+        pathing = PathingGrid(self.game_map, self.entities)
+
+        # Monsters act in list order, the store picks them out without visiting every item and corpse
+        for entity in self.entities.select(AI):
+            # Each monster's span is named after it and says where it stood, so a slow one can be found on the map
+            if tracer:
+                tracer.begin(entity.name, 'ai', {'ai': type(entity.ai).__name__, 'x': entity.x, 'y': entity.y})
+
+            enemy_turn_results = entity.ai.take_turn(player, self.fov_map, self.game_map, self.entities, pathing)
+
+            if tracer:
+                tracer.end({'to_x': entity.x, 'to_y': entity.y})
+
+            results.extend(enemy_turn_results)
+            self.apply_results(enemy_turn_results)
+
+            # Only the player's death ends the phase early
+            if self.game_state == GameStates.PLAYER_DEAD:
+                self.killed_by = entity.name
+                break
+        else:
+            self.game_state = GameStates.PLAYERS_TURN
+
+        if tracer:
+            tracer.end()
+
+        return results
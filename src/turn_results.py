@@ -0,0 +1,71 @@
+"""
+    Results of a turn - what attacks, items and monsters report back to the turn engine.
+    Each kind of result is its own class, so the engine hands it straight to the handler registered for its type
+    (see TurnEngine.result_handlers) instead of probing a dict for every key a result might have.
+    Results are handled in the order they were made; a result that used to carry a message is preceded by it.
+"""
+
+
+class TurnResult:
+    __slots__ = ()
+
+
+# A message for the message log
+class LogMessage(TurnResult):
+    __slots__ = ('message',)
+
+    def __init__(self, message):
+        self.message = message
+
+
+# An entity ran out of hit points, xp is what it is worth to whoever killed it
+class Died(TurnResult):
+    __slots__ = ('entity', 'xp')
+
+    def __init__(self, entity, xp=0):
+        self.entity = entity
+        self.xp = xp
+
+
+# An item was picked up from the floor
+class ItemAdded(TurnResult):
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+
+# The item being used was used up
+class ItemConsumed(TurnResult):
+    __slots__ = ()
+
+
+# An item was dropped from the inventory onto the floor
+class ItemDropped(TurnResult):
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+
+# The item being used needs a target picked first
+class TargetingStarted(TurnResult):
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+
+# The player backed out of picking a target
+class TargetingCancelled(TurnResult):
+    __slots__ = ()
+
+
+# The player took the stairs, for the front end
+class FloorChanged(TurnResult):
+    __slots__ = ()
+
+
+# The player asked to leave the game, for the front end
+class ExitRequested(TurnResult):
+    __slots__ = ()